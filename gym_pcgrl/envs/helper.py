@@ -22,26 +22,6 @@ def get_tile_locations(map, tile_values):
             tiles[map[y][x]].append((x,y))
     return tiles
 
-"""
-Get the vertical distance to certain type of tiles
-
-Parameters:
-    map (any[][]): the actual map
-    x (int): the x position of the start location
-    y (int): the y position of the start location
-    types (any[]): an array of types of tiles
-
-Returns:
-    int: the distance to certain types underneath a certain location
-"""
-def _calc_dist_floor(map, x, y, types):
-    for dy in range(len(map)):
-        if y+dy >= len(map):
-            break
-        if map[y+dy][x] in types:
-            return dy-1
-    return len(map) - 1
-
 """
 Public function to calculate the distance of a certain tiles to the floor tiles
 
@@ -54,58 +34,55 @@ Returns:
     int: a value of how far each tile from the floor where 0 means on top of floor and positive otherwise
 """
 def get_floor_dist(map, fromTypes, floorTypes):
-    result = 0
-    for y in range(len(map)):
-        for x in range(len(map[y])):
-            if map[y][x] in fromTypes:
-                result += _calc_dist_floor(map, x, y, floorTypes)
-    return result
+    map = np.asarray(map)
+    height = map.shape[0]
+    rows = np.arange(height).reshape(-1, 1)
+    # the first floor row at or below every cell, height if there is none
+    floor = np.where(np.isin(map, floorTypes), rows, height)
+    floor = np.minimum.accumulate(floor[::-1], axis=0)[::-1]
+    dist = np.where(floor < height, floor - rows - 1, height - 1)
+    return int(dist[np.isin(map, fromTypes)].sum())
 
 """
-Get number of tiles that have certain value arround certain position
+Get the number of tiles that is a group of certain size
 
 Parameters:
     map (any[][]): the current map
-    x (int): the x position of the start location
-    y (int): the y position of the start location
     types (any[]): an array of types of tiles
     relLocs ((int,int)[]): a tuple array of all the relative positions
+    min (int): min number of tiles around
+    max (int): max number of tiles around
 
 Returns:
-    int: the number of similar tiles around a certain location
+    int: the number of tiles that have surrounding between min and max
 """
-def _calc_group_value(map, x, y, types, relLocs):
-    result = 0
-    for l in relLocs:
-        nx, ny = x+l[0], y+l[1]
-        if nx < 0 or ny < 0 or nx >= len(map[0]) or ny >= len(map):
-            continue
-        if map[ny][nx] in types:
-            result += 1
-    return result
+def get_type_grouping(map, types, relLocs, min, max):
+    tiles = np.isin(np.asarray(map), types)
+    height, width = tiles.shape
+    value = np.zeros(tiles.shape, dtype=int)
+    for dx, dy in relLocs:
+        # the neighbors outside the map are not counted
+        shifted = np.zeros(tiles.shape, dtype=bool)
+        shifted[_get_shifted_slice(dy, height), _get_shifted_slice(dx, width)] =\
+            tiles[_get_shifted_slice(-dy, height), _get_shifted_slice(-dx, width)]
+        value += shifted
+    return int(np.count_nonzero(tiles & (value >= min) & (value <= max)))
 
 """
-Get the number of tiles that is a group of certain size
+Private function to get the part of an axis where the neighbor at offset of every cell is
+still inside the axis
 
 Parameters:
-    map (any[][]): the current map
-    types (any[]): an array of types of tiles
-    relLocs ((int,int)[]): a tuple array of all the relative positions
-    min (int): min number of tiles around
-    max (int): max number of tiles around
+    offset (int): the relative position of the neighbor
+    size (int): the size of the axis
 
 Returns:
-    int: the number of tiles that have surrounding between min and max
+    slice: the cells that have their neighbor inside the axis
 """
-def get_type_grouping(map, types, relLocs, min, max):
-    result = 0
-    for y in range(len(map)):
-        for x in range(len(map[y])):
-            if map[y][x] in types:
-                value = _calc_group_value(map, x, y, types, relLocs)
-                if value >= min and value <= max:
-                    result += 1
-    return result
+def _get_shifted_slice(offset, size):
+    if offset > 0:
+        return slice(0, max(size - offset, 0))
+    return slice(min(-offset, size), size)
 
 """
 Get the number of changes of tiles in either vertical or horizontal direction
@@ -118,23 +95,10 @@ Returns:
     int: number of different tiles either in vertical or horizontal direction
 """
 def get_changes(map, vertical=False):
-    start_y = 0
-    start_x = 0
+    map = np.asarray(map)
     if vertical:
-        start_y = 1
-    else:
-        start_x = 1
-    value = 0
-    for y in range(start_y, len(map)):
-        for x in range(start_x, len(map[y])):
-            same = False
-            if vertical:
-                same = map[y][x] == map[y-1][x]
-            else:
-                same = map[y][x] == map[y][x-1]
-            if not same:
-                value += 1
-    return value
+        return int(np.count_nonzero(map[1:] != map[:-1]))
+    return int(np.count_nonzero(map[:, 1:] != map[:, :-1]))
 
 """
 Private function to get a list of all tile locations on the map that have any of
@@ -183,6 +147,49 @@ def _flood_fill(x, y, color_map, map, color_index, passable_values):
             queue.append((nx, ny))
     return num_tiles
 
+"""
+Private function to get the bitboard of the tiles of a map that have a certain value, bit
+y * (width + 1) + x is set for a tile with the value. The extra column is always 0 so the bits
+shifted past the end of a row never wrap to the next one
+
+Parameters:
+    map (any[][]): the current map
+    value (any): the tile value of the set bits
+
+Returns:
+    int: the bitboard of the tiles
+    int: the stride between two rows (width + 1)
+"""
+def _get_bitboard(map, value):
+    # the bits are joined from the first tile and reversed since int() reads the highest bit first
+    bits = "".join(["".join(["1" if t == value else "0" for t in row]) + "0" for row in map])
+    return int(bits[::-1], 2), len(map[0]) + 1
+
+"""
+Private function that runs breadth first search on a bitboard, every step grows the whole
+frontier by one tile at once using shifts
+
+Parameters:
+    seed (int): the bitboard of the starting tiles
+    bitboard (int): the bitboard of the passable tiles
+    stride (int): the stride between two rows of the bitboard
+
+Returns:
+    int: the bitboard of all the reached tiles
+    int: the bitboard of the farthest reached tiles
+    int: the distance of the farthest reached tiles
+"""
+def _flood_bitboard(seed, bitboard, stride):
+    region, frontier, dist = seed, seed, 0
+    while True:
+        grown = (frontier << 1) | (frontier >> 1) | (frontier << stride) | (frontier >> stride)
+        grown &= bitboard & ~region
+        if grown == 0:
+            return region, frontier, dist
+        region |= grown
+        frontier = grown
+        dist += 1
+
 """
 Calculates the number of regions in the current map with passable_values
 
@@ -195,6 +202,15 @@ Returns:
     int: number of regions in the map
 """
 def calc_num_regions(map, map_locations, passable_values):
+    # two tile masks (one passable value) are flooded as bitboards
+    if len(set(passable_values)) == 1:
+        bitboard, stride = _get_bitboard(map, passable_values[0])
+        region_index = 0
+        while bitboard != 0:
+            region, _, _ = _flood_bitboard(bitboard & -bitboard, bitboard, stride)
+            bitboard &= ~region
+            region_index += 1
+        return region_index
     empty_tiles = _get_certain_tiles(map_locations, passable_values)
     region_index=0
     color_map = np.full((len(map), len(map[0])), -1)
@@ -220,20 +236,8 @@ Returns:
     int[][]: returns the dikjstra map after running the dijkstra algorithm
 """
 def run_dikjstra(x, y, map, passable_values):
-    dikjstra_map = np.full((len(map), len(map[0])),-1)
-    visited_map = np.zeros((len(map), len(map[0])))
-    queue = [(x, y, 0)]
-    while len(queue) > 0:
-        (cx,cy,cd) = queue.pop(0)
-        if map[cy][cx] not in passable_values or (dikjstra_map[cy][cx] >= 0 and dikjstra_map[cy][cx] <= cd):
-            continue
-        visited_map[cy][cx] = 1
-        dikjstra_map[cy][cx] = cd
-        for (dx,dy) in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            nx,ny=cx+dx,cy+dy
-            if nx < 0 or ny < 0 or nx >= len(map[0]) or ny >= len(map):
-                continue
-            queue.append((nx, ny, cd + 1))
+    dikjstra_map = run_bfs(map, [(x, y)], passable_values)
+    visited_map = (dikjstra_map >= 0).astype(float)
     return dikjstra_map, visited_map
 
 """
@@ -248,17 +252,37 @@ Returns:
     int: the longest path in tiles in the current map
 """
 def calc_longest_path(map, map_locations, passable_values):
+    # two tile masks (one passable value) are searched as bitboards, the tiles are visited in
+    # the same order as map_locations so the lowest bit is the first tile of every region and
+    # the lowest bit of the farthest tiles is the first one the np.argmax of the distances gives
+    if len(set(passable_values)) == 1:
+        bitboard, stride = _get_bitboard(map, passable_values[0])
+        remaining, final_value = bitboard, 0
+        while remaining != 0:
+            region, farthest, _ = _flood_bitboard(remaining & -remaining, bitboard, stride)
+            remaining &= ~region
+            _, _, max_value = _flood_bitboard(farthest & -farthest, bitboard, stride)
+            if max_value > final_value:
+                final_value = max_value
+        return final_value
     empty_tiles = _get_certain_tiles(map_locations, passable_values)
-    final_visited_map = np.zeros((len(map), len(map[0])))
+    grid = _search_grid
+    mask = grid.get_mask(map, passable_values)
+    final_visited = bytearray(len(mask))
     final_value = 0
     for (x,y) in empty_tiles:
-        if final_visited_map[y][x] > 0:
+        cell = grid.get_cell(x, y)
+        if final_visited[cell]:
             continue
-        dikjstra_map, visited_map = run_dikjstra(x, y, map, passable_values)
-        final_visited_map += visited_map
-        (my,mx) = np.unravel_index(np.argmax(dikjstra_map, axis=None), dikjstra_map.shape)
-        dikjstra_map, _ = run_dikjstra(mx, my, map, passable_values)
-        max_value = np.max(dikjstra_map)
+        # the queue of the search has the visited cells in order of their distance
+        count = grid.run_search([cell], mask)
+        cells = grid.queue[:count]
+        for c in cells:
+            final_visited[c] = 1
+        max_value = grid.dist[cells[-1]]
+        far = min(c for c in cells if grid.dist[c] == max_value)
+        count = grid.run_search([far], mask)
+        max_value = grid.dist[grid.queue[count - 1]]
         if max_value > final_value:
             final_value = max_value
     return final_value
@@ -295,6 +319,209 @@ def calc_num_reachable_tile(map, map_locations, start_value, passable_values, re
             total += 1
     return total
 
+"""
+A grid for fast breadth first searches over the maps. The map is padded with a border of
+impassable cells so the neighbors of a cell are cell - 1, cell + 1, cell - stride and
+cell + stride without any bound checks. The scratch buffers (visited marks, distances and the
+queue) are kept between the searches and only reallocated when the map size changes, every
+search marks its cells with a new stamp so the buffers never have to be cleared
+"""
+class SearchGrid:
+    def __init__(self):
+        self.shape = None
+        self.stamp = 0
+
+    """
+    Get the passable mask of a map, it has to be called before searching a new map
+
+    Parameters:
+        map (any[][]): the current map, integer maps are faster than string maps
+        tile_values (any[]): the passable tile values
+
+    Returns:
+        bytes: 1 for every passable cell of the padded map and 0 otherwise
+    """
+    def get_mask(self, map, tile_values):
+        shape = (len(map), len(map[0]))
+        if shape != self.shape:
+            self.shape = shape
+            self.stride = shape[1] + 2
+            size = (shape[0] + 2) * self.stride
+            self.marks = [0] * size
+            self.dist = [0] * size
+            self.queue = [0] * size
+        if isinstance(map, np.ndarray) and map.dtype.kind in "iu":
+            # a lookup table from the tile numbers is faster than np.isin on small maps
+            lookup = np.zeros(int(map.max()) + 1, dtype=np.uint8)
+            lookup[[v for v in tile_values if 0 <= v < len(lookup)]] = 1
+            mask = np.zeros((shape[0] + 2, self.stride), dtype=np.uint8)
+            mask[1:-1, 1:-1] = lookup[map]
+            return mask.tobytes()
+        tile_values = set(tile_values)
+        mask = bytearray((shape[0] + 2) * self.stride)
+        for y in range(shape[0]):
+            start = (y + 1) * self.stride + 1
+            mask[start:start + shape[1]] = bytes(t in tile_values for t in map[y])
+        return bytes(mask)
+
+    """
+    Get the padded cell of a map position
+    """
+    def get_cell(self, x, y):
+        return (y + 1) * self.stride + x + 1
+
+    """
+    Private function that runs a breadth first search from the source cells over the mask, the
+    visited cells get the current stamp and their distance from the nearest source
+
+    Parameters:
+        sources (int[]): the cells to start from at distance 0
+        mask (bytes): the passable mask from get_mask
+        targets (bytes): stop at the first reached cell that is 1 in this mask, None to visit all
+
+    Returns:
+        int: the number of visited cells or the distance of the nearest target (-1 if no target
+        is reachable) if targets is not None
+    """
+    def _search(self, sources, mask, targets=None):
+        marks, dist, queue, stamp, stride = self.marks, self.dist, self.queue, self.stamp, self.stride
+        head, tail = 0, 0
+        for cell in sources:
+            if mask[cell] and marks[cell] != stamp:
+                if targets is not None and targets[cell]:
+                    return 0
+                marks[cell], dist[cell] = stamp, 0
+                queue[tail] = cell
+                tail += 1
+        while head < tail:
+            cell = queue[head]
+            head += 1
+            d = dist[cell] + 1
+            for n in (cell - 1, cell + 1, cell - stride, cell + stride):
+                if mask[n] and marks[n] != stamp:
+                    if targets is not None and targets[n]:
+                        return d
+                    marks[n], dist[n] = stamp, d
+                    queue[tail] = n
+                    tail += 1
+        if targets is not None:
+            return -1
+        return tail
+
+    """
+    Get the distances from the source cells to all the cells that can be reached from them
+
+    Parameters:
+        sources (int[]): the cells to start from at distance 0
+        mask (bytes): the passable mask from get_mask
+
+    Returns:
+        int: the number of reached cells, the distance of a cell is get_dist(cell)
+    """
+    def run_search(self, sources, mask):
+        self.stamp += 1
+        return self._search(sources, mask)
+
+    """
+    Get the distance of a cell from the last search, -1 if it was not reached
+    """
+    def get_dist(self, cell):
+        if self.marks[cell] != self.stamp:
+            return -1
+        return self.dist[cell]
+
+    """
+    Get the distances of the last search as a map, -1 for the cells that were not reached
+
+    Returns:
+        int[][]: the distance of every cell of the map
+    """
+    def get_dist_map(self):
+        marks = np.array(self.marks).reshape(-1, self.stride)[1:-1, 1:-1]
+        dist = np.array(self.dist).reshape(-1, self.stride)[1:-1, 1:-1]
+        return np.where(marks == self.stamp, dist, -1)
+
+    """
+    Get the distance from the source cells to the nearest target cell, the search stops as soon
+    as a target is reached
+
+    Parameters:
+        sources (int[]): the cells to start from at distance 0
+        mask (bytes): the passable mask from get_mask
+        targets (bytes): a mask where the target cells are 1
+
+    Returns:
+        int: the distance to the nearest target or -1 if no target can be reached
+    """
+    def get_nearest(self, sources, mask, targets):
+        self.stamp += 1
+        return self._search(sources, mask, targets)
+
+    """
+    Count the connected regions of the mask, the first region is flooded from the first cell
+    so get_dist returns the distances from it for the cells of that region
+
+    Parameters:
+        mask (bytes): the passable mask from get_mask
+        first (int): the cell to flood first, None to start from the top left region
+
+    Returns:
+        int: number of regions in the mask
+    """
+    def count_regions(self, mask, first=None):
+        self.stamp += 1
+        regions = 0
+        if first is not None and self._search([first], mask) > 0:
+            regions += 1
+        marks, stamp = self.marks, self.stamp
+        for cell in range(len(mask)):
+            if mask[cell] and marks[cell] != stamp:
+                self._search([cell], mask)
+                regions += 1
+        return regions
+
+"""
+The search grid shared by the helper functions
+"""
+_search_grid = SearchGrid()
+
+"""
+Run a breadth first search from all the sources at once, every cell gets the distance to its
+nearest source
+
+Parameters:
+    map (any[][]): the current map
+    sources ((int,int)[]): the (x,y) positions to start from, the ones that are not passable are ignored
+    passable_values (any[]): an array of all the passable tile values
+
+Returns:
+    int[][]: the distance of every cell to the nearest source, -1 if it can't be reached
+"""
+def run_bfs(map, sources, passable_values):
+    grid = _search_grid
+    mask = grid.get_mask(map, passable_values)
+    grid.run_search([grid.get_cell(x, y) for (x,y) in sources], mask)
+    return grid.get_dist_map()
+
+"""
+Calculate the distance from the sources to the nearest tile that has any of the target values,
+the search stops as soon as the first target is reached
+
+Parameters:
+    map (any[][]): the current map
+    sources ((int,int)[]): the (x,y) positions to start from, the ones that are not passable are ignored
+    passable_values (any[]): an array of all the passable tile values
+    target_values (any[]): the tile values that are searched for, they have to be passable to be reached
+
+Returns:
+    int: the distance to the nearest target tile, -1 if none can be reached
+"""
+def calc_nearest_dist(map, sources, passable_values, target_values):
+    grid = _search_grid
+    mask = grid.get_mask(map, passable_values)
+    targets = grid.get_mask(map, target_values)
+    return grid.get_nearest([grid.get_cell(x, y) for (x,y) in sources], mask, targets)
+
 """
 Generate random map based on the input Parameters
 
@@ -330,6 +557,20 @@ def get_string_map(map, tiles):
             result[y].append(int_to_string[int(map[y][x])])
     return result
 
+"""
+A method to convert the map to use the tile numbers instead of tile names (the opposite of get_string_map)
+
+Parameters:
+    map (string[][]): a 2D map of tile strings
+    tiles (string[]): a list of all the tiles in order
+
+Returns:
+    numpy.uint8[][]: a numpy 2D array of the tile numbers
+"""
+def get_int_map(map, tiles):
+    string_to_int = dict((s, i) for i, s in enumerate(tiles))
+    return np.array([[string_to_int[t] for t in row] for row in map], dtype=np.uint8)
+
 """
 A method to convert the probability dictionary to use tile numbers instead of tile names
 
@@ -130,6 +130,7 @@ class PcgrlEnv(gym.Env):
         self._iteration += 1
         #save copy of the old stats to calculate the reward
         old_stats = self._rep_stats
+        solver_calls = self._get_solver_calls()
         # update the current state to the new state based on the taken action
         change, x, y = self._rep.update(action)
         if change > 0:
@@ -146,9 +147,22 @@ class PcgrlEnv(gym.Env):
         info["changes"] = self._changes
         info["max_iterations"] = self._max_iterations
         info["max_changes"] = self._max_changes
+        # the solver stats are only added when this step called the solver (or got its result from the cache)
+        if solver_calls is not None and self._get_solver_calls() != solver_calls:
+            info["solver"] = self._prob.get_solver_stats()["last"]
         #return the values
         return observation, reward, done, info
 
+    """
+    Private function to get the number of solver calls of the problem so far, None if the
+    problem has no solver or the solver_stats parameter is False
+    """
+    def _get_solver_calls(self):
+        solver_stats = self._prob.get_solver_stats()
+        if solver_stats is None:
+            return None
+        return solver_stats["total"]["calls"]
+
     """
     Render the current state of the environment
 
@@ -173,10 +187,21 @@ class PcgrlEnv(gym.Env):
             self.viewer.imshow(img)
             return self.viewer.isopen
 
+    """
+    Save the record of all the solver calls of the problem to a csv or json file, the
+    solver_stats parameter has to be True to record them
+
+    Parameters:
+        path (string): the file path to save the stats
+    """
+    def dump_solver_stats(self, path):
+        self._prob.dump_solver_stats(path)
+
     """
     Close the environment
     """
     def close(self):
+        self._prob.close()
         if self.viewer:
             self.viewer.close()
             self.viewer = None
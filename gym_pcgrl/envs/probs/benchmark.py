@@ -0,0 +1,142 @@
+"""
+A benchmark for the game solvers that runs every problem's _run_game over a fixed corpus of
+easy, hard and unsolvable (within the solver budget) levels stored in the game folders as
+benchmark.json. It reports the wall time, the expansions per second and the solution length
+of every level and checks the results against the recorded ones to catch engine regressions.
+
+Usage:
+    python -m gym_pcgrl.envs.probs.benchmark [--record] [--repeat N] [game ...]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from gym_pcgrl.envs.probs import PROBLEMS
+from gym_pcgrl.envs.helper import get_string_map
+
+"""
+The problems that have a benchmark corpus
+"""
+BENCHMARK_PROBLEMS = ["sokoban", "ddave", "mdungeon", "smb"]
+
+"""
+Get the path of the benchmark corpus of a problem
+
+Parameters:
+    name (string): the problem name
+
+Returns:
+    string: the path of the benchmark.json file
+"""
+def get_corpus_path(name):
+    return os.path.join(os.path.dirname(__file__), name, "benchmark.json")
+
+"""
+Load the benchmark corpus of a problem, every level has a "name", a "difficulty" ("easy",
+"hard" or "unsolvable"), a "map" where every row is a string of tile numbers and the
+"expected" result of _run_game without the timeout flag
+
+Parameters:
+    name (string): the problem name
+
+Returns:
+    dict(string,any)[]: the levels of the corpus
+"""
+def load_corpus(name):
+    with open(get_corpus_path(name)) as f:
+        return json.load(f)["levels"]
+
+"""
+Private function to make the _run_game results json comparable (tuples become lists and
+numpy numbers become python numbers)
+"""
+def _normalize(value):
+    return json.loads(json.dumps(value, default=lambda v: v.item()))
+
+"""
+Run the benchmark on the corpus of the problems
+
+Parameters:
+    names (string[]): the problems to run, None to run all the BENCHMARK_PROBLEMS
+    record (boolean): save the current results as the expected results of the corpus
+    repeat (int): the number of times every level is solved, the fastest run is reported
+
+Returns:
+    dict(string,any)[]: the result of every level with the "problem", "name", "difficulty",
+    "time" in milliseconds, "expansions", "expansions-sec", solution "length", "win" and
+    "pass" (True if the result is the same as the expected one)
+"""
+def run_benchmark(names=None, record=False, repeat=1):
+    if names is None:
+        names = BENCHMARK_PROBLEMS
+    results = []
+    for name in names:
+        prob = PROBLEMS[name]()
+        prob.adjust_param(solver_cache=0, solver_replay=False, solver_stats=True)
+        levels = load_corpus(name)
+        for level in levels:
+            int_map = np.array([[int(t) for t in row] for row in level["map"]], dtype=np.uint8)
+            prob.adjust_param(width=int_map.shape[1], height=int_map.shape[0])
+            map = get_string_map(int_map, prob.get_tile_types())
+            elapsed = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = prob._run_game(map)
+                run_time = time.perf_counter() - start
+                if elapsed is None or run_time < elapsed:
+                    elapsed = run_time
+            stats = prob.get_solver_stats()["last"]
+            result = _normalize(result[:-1])
+            if record:
+                level["expected"] = result
+            results.append({
+                "problem": name,
+                "name": level["name"],
+                "difficulty": level["difficulty"],
+                "time": elapsed * 1000.0,
+                "expansions": stats["visited"],
+                "expansions-sec": stats["visited"] / max(elapsed, 1e-9),
+                "length": stats["length"],
+                "win": stats["win"],
+                "pass": result == level.get("expected")
+            })
+        if record:
+            with open(get_corpus_path(name), "w") as f:
+                json.dump({"levels": levels}, f, indent=1)
+                f.write("\n")
+    return results
+
+"""
+Print the benchmark results as a table followed by the totals of every problem
+
+Parameters:
+    results (dict(string,any)[]): the results from run_benchmark
+    file (file): where to print the report
+"""
+def print_report(results, file=sys.stdout):
+    print("{:<10}{:<14}{:<12}{:>10}{:>12}{:>14}{:>8}{:>6}{:>6}".format("problem", "level",
+        "difficulty", "time(ms)", "expansions", "expansions/s", "length", "win", "pass"), file=file)
+    for r in results:
+        print("{:<10}{:<14}{:<12}{:>10.1f}{:>12}{:>14.0f}{:>8}{:>6}{:>6}".format(r["problem"], r["name"],
+            r["difficulty"], r["time"], r["expansions"], r["expansions-sec"], r["length"],
+            str(r["win"]), str(r["pass"])), file=file)
+    for name in sorted(set(r["problem"] for r in results)):
+        problem_results = [r for r in results if r["problem"] == name]
+        total_time = sum(r["time"] for r in problem_results)
+        total_expansions = sum(r["expansions"] for r in problem_results)
+        print("{}: {:.1f}ms, {} expansions, {:.0f} expansions/s, {}/{} passed".format(name, total_time,
+            total_expansions, total_expansions / max(total_time / 1000.0, 1e-9),
+            sum(r["pass"] for r in problem_results), len(problem_results)), file=file)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the game solvers on the reference corpus")
+    parser.add_argument("games", nargs="*", default=None, help="the games to run (default: all)")
+    parser.add_argument("--record", action="store_true", help="save the results as the expected results")
+    parser.add_argument("--repeat", type=int, default=1, help="solve every level N times and keep the fastest")
+    args = parser.parse_args()
+    results = run_benchmark(args.games or None, args.record, args.repeat)
+    print_report(results)
+    if not args.record and not all(r["pass"] for r in results):
+        sys.exit(1)
@@ -1,133 +1,10 @@
-from queue import PriorityQueue
+import numpy as np
+from gym_pcgrl.envs.probs.search import BFSAgent,DFSAgent,AStarAgent
 
+# the action index of every direction is its index in this list
 directions = [{"x":0, "y":0}, {"x":-1, "y":0}, {"x":1, "y":0}, {"x":0, "y":-1}]
-class Node:
-    balance = 0.5
-    def __init__(self, state, parent, action):
-        self.state = state
-        self.parent = parent
-        self.action = action
-        self.depth = 0
-        if self.parent != None:
-            self.depth = parent.depth + 1
-
-    def getChildren(self):
-        children = []
-        for d in directions:
-            childState = self.state.clone()
-            childState.update(d["x"], d["y"])
-            children.append(Node(childState, self, d))
-        return children
-
-    def getKey(self):
-        return self.state.getKey()
-
-    def getCost(self):
-        return self.depth
-
-    def getHeuristic(self):
-        return self.state.getHeuristic()
-
-    def checkWin(self):
-        return self.state.checkWin()
-
-    def checkLose(self):
-        return self.state.checkLose()
-
-    def checkOver(self):
-        return self.state.checkOver()
-
-    def getGameStatus(self):
-        return self.state.getGameStatus()
-
-    def getActions(self):
-        actions = []
-        current = self
-        while(current.parent != None):
-            actions.insert(0,current.action)
-            current = current.parent
-        return actions
-
-    def __str__(self):
-        return str(self.depth) + "," + str(self.state.getHeuristic()) + "\n" + str(self.state)
-
-    def __lt__(self, other):
-        return self.getHeuristic()+Node.balance*self.getCost() < other.getHeuristic()+Node.balance*other.getCost()
-
-class Agent:
-    def getSolution(self, state, maxIterations):
-        return []
-
-class BFSAgent(Agent):
-    def getSolution(self, state, maxIterations=-1):
-        iterations = 0
-        bestNode = None
-        queue = [Node(state.clone(), None, None)]
-        visisted = set()
-        while (iterations < maxIterations or maxIterations <= 0) and len(queue) > 0:
-            iterations += 1
-            current = queue.pop(0)
-            if current.checkLose():
-                continue
-            if current.checkWin():
-                return current.getActions(), current, iterations
-            if current.getKey() not in visisted:
-                if bestNode == None or current.getHeuristic() < bestNode.getHeuristic():
-                    bestNode = current
-                elif current.getHeuristic() == bestNode.getHeuristic() and current.getCost() < bestNode.getCost():
-                    bestNode = current
-                visisted.add(current.getKey())
-                queue.extend(current.getChildren())
-        return bestNode.getActions(), bestNode, iterations
-
-class DFSAgent(Agent):
-    def getSolution(self, state, maxIterations=-1):
-        iterations = 0
-        bestNode = None
-        queue = [Node(state.clone(), None, None)]
-        visisted = set()
-        while (iterations < maxIterations or maxIterations <= 0) and len(queue) > 0:
-            iterations += 1
-            current = queue.pop()
-            if current.checkLose():
-                continue
-            if current.checkWin():
-                return current.getActions(), current, iterations
-            if current.getKey() not in visisted:
-                if bestNode == None or current.getHeuristic() < bestNode.getHeuristic():
-                    bestNode = current
-                elif current.getHeuristic() == bestNode.getHeuristic() and current.getCost() < bestNode.getCost():
-                    bestNode = current
-                visisted.add(current.getKey())
-                queue.extend(current.getChildren())
-        return bestNode.getActions(), bestNode, iterations
-
-class AStarAgent(Agent):
-    def getSolution(self, state, balance=1, maxIterations=-1):
-        iterations = 0
-        bestNode = None
-        Node.balance = balance
-        queue = PriorityQueue()
-        queue.put(Node(state.clone(), None, None))
-        visisted = set()
-        while (iterations < maxIterations or maxIterations <= 0) and queue.qsize() > 0:
-            iterations += 1
-            current = queue.get()
-            if current.checkLose():
-                continue
-            if current.checkWin():
-                return current.getActions(), current, iterations
-            if current.getKey() not in visisted:
-                if bestNode == None or current.getHeuristic() < bestNode.getHeuristic():
-                    bestNode = current
-                elif current.getHeuristic() == bestNode.getHeuristic() and current.getCost() < bestNode.getCost():
-                    bestNode = current
-                visisted.add(current.getKey())
-                children = current.getChildren()
-                for c in children:
-                    queue.put(c)
-        return bestNode.getActions(), bestNode, iterations
-
+# the transition table of every (width, solid) layout, the generator keeps editing the same levels
+_layoutCache = {}
 class State:
     def __init__(self):
         self.solid = []
@@ -136,6 +13,11 @@ class State:
         self.player = None
         self.key = None
         self.door = None
+        # the bitmask of the remaining items, bit i is the diamond i and the last bit is the key
+        self.items = 0
+        self.transitions = None
+        self.tileGrid = None
+        self.itemGrid = None
         self._airTime = 3
         self._hangTime = 1
 
@@ -187,6 +69,91 @@ class State:
                         self.door = {"x": x, "y": y}
                     elif c == "V":
                         self.key = {"x": x, "y": y}
+        self.initializeTables()
+
+    """
+    Initialize the level from a 2D map of tile numbers (0: empty, 1: solid, 2: player, 3: exit,
+    4: diamond, 5: key, 6: spike) surrounded by border cells of solid tiles on every side
+    """
+    def mapInitialize(self, map, border=1):
+        self.width = len(map[0]) + 2*border
+        self.height = len(map) + 2*border
+        self.solid = [[True] * self.width for _ in range(self.height)]
+        for y in range(len(map)):
+            for x in range(len(map[y])):
+                value = int(map[y][x])
+                x1, y1 = x + border, y + border
+                self.solid[y1][x1] = value == 1
+                if value == 4:
+                    self.diamonds.append({"x": x1, "y": y1})
+                elif value == 6:
+                    self.spikes.append({"x": x1, "y": y1})
+                elif value == 2:
+                    self.player = {"x": x1, "y": y1, "health": 1, "airTime": 0, "diamonds": 0, "key": 0, "jumps": 0}
+                elif value == 3:
+                    self.door = {"x": x1, "y": y1}
+                elif value == 5:
+                    self.key = {"x": x1, "y": y1}
+        self.initializeTables()
+
+    """
+    Build the per level lookup tables shared by all the clones. The transition table is indexed by
+    ((y * width + x) * airTimes + airTime) * 4 + action for the current (x, y, airTime) and action,
+    where airTimes is 4 (airTime is between 0 and 3). Each entry is the next (x, y, airTime) and
+    whether the action jumped, packed as ((y * width + x) * airTimes + airTime) * 2 + jumped. It is
+    computed the same way as the update used to do it with the cells outside the level being solid.
+    The tile grid has the collectible or spike tile number (4: diamond, 5: key, 6: spike) of every
+    cell or 0 and the item grid has the bit index of the diamond or key of every cell. The diamonds
+    and the key are never removed from the level, the items bitmask has the ones that are not
+    collected yet
+    """
+    def initializeTables(self):
+        key = (self.width, tuple(tuple(row) for row in self.solid))
+        self.transitions = _layoutCache.get(key)
+        if self.transitions is None:
+            self.transitions = self._getTransitions()
+            if len(_layoutCache) >= 1024:
+                _layoutCache.clear()
+            _layoutCache[key] = self.transitions
+        self.tileGrid = [0] * (self.width * self.height)
+        self.itemGrid = [-1] * (self.width * self.height)
+        for i, d in enumerate(self.diamonds):
+            self.tileGrid[d["y"] * self.width + d["x"]] = 4
+            self.itemGrid[d["y"] * self.width + d["x"]] = i
+        for s in self.spikes:
+            self.tileGrid[s["y"] * self.width + s["x"]] = 6
+        if self.key is not None:
+            self.tileGrid[self.key["y"] * self.width + self.key["x"]] = 5
+            self.itemGrid[self.key["y"] * self.width + self.key["x"]] = len(self.diamonds)
+        self.items = (1 << (len(self.diamonds) + int(self.key is not None))) - 1
+
+    def _getTransitions(self):
+        airTimes = self._airTime + 1
+        solid = np.ones((self.height + 2, self.width + 2), dtype=bool)
+        solid[1:-1, 1:-1] = self.solid
+        movable = ~solid
+        # the coordinates are shifted by one in the padded grids
+        y, x, airTime = np.meshgrid(np.arange(1, self.height + 1), np.arange(1, self.width + 1),\
+            np.arange(airTimes), indexing="ij")
+        y, x, airTime = y.ravel(), x.ravel(), airTime.ravel()
+        ground = solid[y + 1, x]
+        cieling = solid[y - 1, x]
+        transitions = []
+        for d in directions:
+            newX, newAirTime, jumped = x, airTime, np.zeros(len(x), dtype=bool)
+            if d["x"] != 0:
+                newX = np.where(movable[y, x + d["x"]], x + d["x"], x)
+            elif d["y"] == -1:
+                jumped = ground & ~cieling
+                newAirTime = np.where(jumped, self._airTime, airTime)
+            rising = newAirTime > self._hangTime
+            falling = newAirTime <= 0
+            up = movable[y - 1, newX]
+            down = movable[y + 1, newX]
+            newY = np.where(rising & up, y - 1, np.where(falling & down, y + 1, y))
+            newAirTime = np.where(rising & ~up, self._hangTime, np.where(falling, newAirTime, newAirTime - 1))
+            transitions.append((((newY - 1) * self.width + newX - 1) * airTimes + newAirTime) * 2 + jumped)
+        return np.stack(transitions, axis=1).ravel().tolist()
 
     def clone(self):
         clone = State()
@@ -195,14 +162,25 @@ class State:
         clone.solid = self.solid
         clone.door = self.door
         clone.spikes = self.spikes
+        clone.diamonds = self.diamonds
         clone.key = self.key
+        clone.items = self.items
+        clone.transitions = self.transitions
+        clone.tileGrid = self.tileGrid
+        clone.itemGrid = self.itemGrid
         clone.player = {"x":self.player["x"], "y":self.player["y"],
             "health":self.player["health"], "airTime": self.player["airTime"],
             "diamonds":self.player["diamonds"], "key": self.player["key"], "jumps":self.player["jumps"]}
-        for d in self.diamonds:
-            clone.diamonds.append(d)
         return clone
 
+    def getNextStates(self):
+        children = []
+        for action, d in enumerate(directions):
+            childState = self.clone()
+            childState.move(action)
+            children.append((d, childState))
+        return children
+
     def checkMovableLocation(self, x, y):
         return not (x < 0 or y < 0 or x >= self.width or y >= self.height or self.solid[y][x])
 
@@ -212,88 +190,69 @@ class State:
                 return s
         return None
 
-    def checkDiamondLocation(self, x, y):
-        for d in self.diamonds:
-            if d["x"] == x and d["y"] == y:
-                return d
+    """
+    Get the item at the location if it is not collected yet
+    """
+    def _getItem(self, x, y, tile):
+        cell = y * self.width + x
+        if self.tileGrid[cell] == tile and self.items >> self.itemGrid[cell] & 1:
+            if tile == 5:
+                return self.key
+            return self.diamonds[self.itemGrid[cell]]
         return None
 
+    def checkDiamondLocation(self, x, y):
+        return self._getItem(x, y, 4)
+
     def checkKeyLocation(self, x, y):
-        if self.key is not None and self.key["x"] == x and self.key["y"] == y:
-            return self.key
-        return None
+        return self._getItem(x, y, 5)
 
     def updatePlayer(self, x, y):
         self.player["x"] = x
         self.player["y"] = y
-        toBeRemoved = self.checkDiamondLocation(x, y)
-        if toBeRemoved is not None:
-            self.player["diamonds"] += 1
-            self.diamonds.remove(toBeRemoved)
-            return
-        toBeRemoved = self.checkSpikeLocation(x, y)
-        if toBeRemoved is not None:
+        cell = y * self.width + x
+        tile = self.tileGrid[cell]
+        if tile == 6:
             self.player["health"] = 0
-            return
-        toBeRemoved = self.checkKeyLocation(x, y)
-        if toBeRemoved is not None:
-            self.player["key"] += 1
-            self.key = None
-            return
+        elif tile != 0 and self.items >> self.itemGrid[cell] & 1:
+            self.items ^= 1 << self.itemGrid[cell]
+            if tile == 4:
+                self.player["diamonds"] += 1
+            else:
+                self.player["key"] += 1
 
     def update(self, dirX, dirY):
-        if self.checkOver():
-            return
         if dirX > 0:
-            dirX=1
-        if dirX < 0:
-            dirX=-1
-        if dirY < 0:
-            dirY=-1
-        else:
-            dirY=0
-
-        ground = self.solid[self.player["y"] + 1][self.player["x"]]
-        cieling = self.solid[self.player["y"] - 1][self.player["x"]]
-        newX = self.player["x"]
-        newY = self.player["y"]
-        if abs(dirX) > 0:
-            if self.checkMovableLocation(newX + dirX, newY):
-                newX = newX + dirX
-        elif dirY == -1:
-            if ground and not cieling:
-                self.player["airTime"] = self._airTime
-                self.player["jumps"] += 1
-
-        if self.player["airTime"] > self._hangTime:
-            self.player["airTime"] -= 1
-            if self.checkMovableLocation(newX, newY - 1):
-                newY = newY - 1
-            else:
-                self.player["airTime"] = self._hangTime
-        elif self.player["airTime"] > 0 and self.player["airTime"] <= self._hangTime:
-            self.player["airTime"] -= 1
+            self.move(2)
+        elif dirX < 0:
+            self.move(1)
+        elif dirY < 0:
+            self.move(3)
         else:
-            if self.checkMovableLocation(newX, newY + 1):
-                newY = newY + 1
+            self.move(0)
 
-        self.updatePlayer(newX, newY)
+    """
+    Apply the action (the index of its direction) using the transition table
+    """
+    def move(self, action):
+        if self.checkOver():
+            return
+        airTimes = self._airTime + 1
+        transition = self.transitions[((self.player["y"] * self.width + self.player["x"]) * airTimes + self.player["airTime"]) * 4 + action]
+        if transition & 1:
+            self.player["jumps"] += 1
+        transition >>= 1
+        self.player["airTime"] = transition % airTimes
+        cell = transition // airTimes
+        self.updatePlayer(cell % self.width, cell // self.width)
 
     def getKey(self):
-        key = str(self.player["x"]) + "," + str(self.player["y"]) + "," + str(self.player["health"]) + "|"
-        key += str(self.door["x"]) + "," + str(self.door["y"]) + "|"
-        if self.key is not None:
-            key += str(self.key["x"]) + "," + str(self.key["y"]) + "|"
-        for d in self.diamonds:
-            key += str(d["x"]) + "," + str(d["y"]) + ","
-        key = key[:-1] + "|"
-        for s in self.spikes:
-            key += str(s["x"]) + "," + str(s["y"]) + ","
-        return key[:-1]
+        # the level layout never changes so only the player and the remaining items are hashed
+        return (self.player["x"], self.player["y"], self.player["health"], self.items)
 
     def getHeuristic(self):
         playerDist = abs(self.player["x"] - self.door["x"]) + abs(self.player["y"] - self.door["y"])
-        if self.key is not None:
+        if self.key is not None and self.player["key"] == 0:
             playerDist = abs(self.player["x"] - self.key["x"]) + abs(self.player["y"] - self.key["y"]) + (self.width + self.height)
         diamondCosts = -self.player["diamonds"]
         return playerDist + 5*diamondCosts
@@ -2,8 +2,9 @@ from PIL import Image
 import os
 import numpy as np
 from gym_pcgrl.envs.probs.problem import Problem
-from gym_pcgrl.envs.helper import get_range_reward, get_tile_locations, calc_certain_tile, calc_num_regions, get_floor_dist
-from gym_pcgrl.envs.probs.ddave.engine import State,BFSAgent,AStarAgent
+from gym_pcgrl.envs.helper import get_int_map, get_range_reward, get_tile_locations, calc_certain_tile, calc_num_regions, get_floor_dist
+from gym_pcgrl.envs.probs.ddave.engine import State
+from gym_pcgrl.envs.probs.solver import Solver
 
 """
 Generate a fully connected level for a simple platformer similar to Dangerous Dave (http://www.dangerousdave.com)
@@ -20,7 +21,10 @@ class DDaveProblem(Problem):
         self._prob = {"empty":0.5, "solid":0.3, "player":0.02, "exit":0.02, "diamond":0.04, "key": 0.02, "spike":0.1}
         self._border_tile = "solid"
 
-        self._solver_power = 5000
+        # new walls can be used to jump from so only a new spike doesn't open a new path, with
+        # solver_replay the last solution is kept after new spikes if it still works
+        self._solver = Solver([("astar", 1), ("astar", 0.5), ("astar", 0), ("bfs",)], 5000,
+            replay_edits=[("empty", "spike")])
 
         self._max_diamonds = 3
         self._min_spikes = 10
@@ -62,12 +66,17 @@ class DDaveProblem(Problem):
         min_spikes (int): the minimum amount of spike that should be in a level
         target_jumps (int): the number of jumps needed to consider the game a success
         target_solution (int): the number of moves needed to consider the game a success
+        solver_power (int): the maximum number of iterations for every search strategy
+        solver_strategies ((string,any)[]): replace the search strategies, [("idastar", 1)] or [("beam", 100)] use bounded memory
+        solver_time (float): the time budget in milliseconds for solving the level, None for no limit
+        solver_shared (boolean): share one visited table between the search strategies with solver_power as the total budget
+        solver_stats (boolean): record the solver stats of every level, see get_solver_stats
         rewards (dict(string,float)): the weights of each reward change between the new_stats and old_stats
     """
     def adjust_param(self, **kwargs):
         super().adjust_param(**kwargs)
 
-        self._solver_power = kwargs.get('solver_power', self._solver_power)
+        self._solver.adjust_param(**kwargs)
 
         self._max_diamonds = kwargs.get('max_diamonds', self._max_diamonds)
         self._min_spikes = kwargs.get('min_spikes', self._min_spikes)
@@ -86,6 +95,8 @@ class DDaveProblem(Problem):
 
     Parameters:
         map (string[][]): the input level to run the game on
+        time_budget (float): the time budget in milliseconds for all the search strategies,
+        if it is None the solver_time parameter is used
 
     Returns:
         float: how close you are to winning (0 if you win)
@@ -93,46 +104,17 @@ class DDaveProblem(Problem):
         dict(string,int): get the status of the best node - "health": player health at that state,
         "airTime": how long before the player start falling, "num_jumps": the number of jumps used till now,
         "col_diamonds": the number of collected diamonds so far, "col_key": the number of collected keys
+        boolean: True if the time budget ran out before finding a solution
     """
-    def _run_game(self, map):
-        gameCharacters=" #@H$V*"
-        string_to_char = dict((s, gameCharacters[i]) for i, s in enumerate(self.get_tile_types()))
-        lvlString = ""
-        for x in range(self._width+2):
-            lvlString += "#"
-        lvlString += "\n"
-        for i in range(len(map)):
-            for j in range(len(map[i])):
-                string = map[i][j]
-                if j == 0:
-                    lvlString += "#"
-                lvlString += string_to_char[string]
-                if j == self._width-1:
-                    lvlString += "#\n"
-        for x in range(self._width+2):
-            lvlString += "#"
-        lvlString += "\n"
-
+    def _run_game(self, map, time_budget=None):
         state = State()
-        state.stringInitialize(lvlString.split("\n"))
-
-        aStarAgent = AStarAgent()
-        bfsAgent = BFSAgent()
+        state.mapInitialize(get_int_map(map, self.get_tile_types()))
 
-        sol,solState,iters = aStarAgent.getSolution(state, 1, self._solver_power)
-        if solState.checkWin():
-            return 0, len(sol), solState.getGameStatus()
-        sol,solState,iters = aStarAgent.getSolution(state, 0.5, self._solver_power)
-        if solState.checkWin():
-            return 0, len(sol), solState.getGameStatus()
-        sol,solState,iters = aStarAgent.getSolution(state, 0, self._solver_power)
-        if solState.checkWin():
-            return 0, len(sol), solState.getGameStatus()
-        sol,solState,iters = bfsAgent.getSolution(state, self._solver_power)
+        sol,solState,timeout = self._solver.solve(state, time_budget, map)
         if solState.checkWin():
-            return 0, len(sol), solState.getGameStatus()
+            return 0, len(sol), solState.getGameStatus(), timeout
 
-        return solState.getHeuristic(), 0, solState.getGameStatus()
+        return solState.getHeuristic(), 0, solState.getGameStatus(), timeout
 
 
     """
@@ -144,7 +126,8 @@ class DDaveProblem(Problem):
         "diamonds": number of diamond tiles, "key": number of key tiles, "spikes": number of spike tiles,
         "reigons": number of connected empty tiles, "num-jumps": number of jumps did by a planning agent,
         "col-diamonds": number of collected diamonds by a planning agent, "dist-win": how close to the win state,
-        "sol-length": length of the solution to win the level
+        "sol-length": length of the solution to win the level,
+        "solver-timeout": if the solver time budget ran out before finding a solution
     """
     def get_stats(self, map):
         map_locations = get_tile_locations(map, self.get_tile_types())
@@ -159,11 +142,12 @@ class DDaveProblem(Problem):
             "num-jumps": 0,
             "col-diamonds": 0,
             "dist-win": self._width * self._height,
-            "sol-length": 0
+            "sol-length": 0,
+            "solver-timeout": False
         }
         if map_stats["player"] == 1:
             if map_stats["exit"] == 1 and map_stats["key"] == 1 and map_stats["regions"] == 1:
-                map_stats["dist-win"], map_stats["sol-length"], play_stats = self._run_game(map)
+                map_stats["dist-win"], map_stats["sol-length"], play_stats, map_stats["solver-timeout"] = self._solver.cached(map, self.get_tile_types(), lambda: self._run_game(map))
                 map_stats["num-jumps"] = play_stats["num_jumps"]
                 map_stats["col-diamonds"] = play_stats["col_diamonds"]
         return map_stats
@@ -1,132 +1,15 @@
-from queue import PriorityQueue
+from collections import deque
+import heapq
+from gym_pcgrl.envs.probs.search import Agent,BFSAgent,DFSAgent,AStarAgent,replayActions
 
 directions = [{"x":-1, "y":0}, {"x":1, "y":0}, {"x":0, "y":-1}, {"x":0, "y":1}]
-class Node:
-    balance = 0.5
-    def __init__(self, state, parent, action):
-        self.state = state
-        self.parent = parent
-        self.action = action
-        self.depth = 0
-        if self.parent != None:
-            self.depth = parent.depth + 1
-
-    def getChildren(self):
-        children = []
-        for d in directions:
-            childState = self.state.clone()
-            childState.update(d["x"], d["y"])
-            children.append(Node(childState, self, d))
-        return children
-
-    def getKey(self):
-        return self.state.getKey()
-
-    def getCost(self):
-        return self.depth
-
-    def getHeuristic(self):
-        return self.state.getHeuristic()
-
-    def checkWin(self):
-        return self.state.checkWin()
-
-    def checkLose(self):
-        return self.state.checkLose()
-
-    def checkOver(self):
-        return self.state.checkOver()
-
-    def getGameStatus(self):
-        return self.state.getGameStatus()
-
-    def getActions(self):
-        actions = []
-        current = self
-        while(current.parent != None):
-            actions.insert(0,current.action)
-            current = current.parent
-        return actions
 
-    def __str__(self):
-        return str(self.depth) + "," + str(self.state.getHeuristic()) + "\n" + str(self.state)
-
-    def __lt__(self, other):
-        return self.getHeuristic()+Node.balance*self.getCost() < other.getHeuristic()+Node.balance*other.getCost()
-
-class Agent:
-    def getSolution(self, state, maxIterations):
-        return []
-
-class BFSAgent(Agent):
-    def getSolution(self, state, maxIterations=-1):
-        iterations = 0
-        bestNode = None
-        queue = [Node(state.clone(), None, None)]
-        visisted = set()
-        while (iterations < maxIterations or maxIterations <= 0) and len(queue) > 0:
-            iterations += 1
-            current = queue.pop(0)
-            if current.checkLose():
-                continue
-            if current.checkWin():
-                return current.getActions(), current, iterations
-            if current.getKey() not in visisted:
-                if bestNode == None or current.getHeuristic() < bestNode.getHeuristic():
-                    bestNode = current
-                elif current.getHeuristic() == bestNode.getHeuristic() and current.getCost() < bestNode.getCost():
-                    bestNode = current
-                visisted.add(current.getKey())
-                queue.extend(current.getChildren())
-        return bestNode.getActions(), bestNode, iterations
-
-class DFSAgent(Agent):
-    def getSolution(self, state, maxIterations=-1):
-        iterations = 0
-        bestNode = None
-        queue = [Node(state.clone(), None, None)]
-        visisted = set()
-        while (iterations < maxIterations or maxIterations <= 0) and len(queue) > 0:
-            iterations += 1
-            current = queue.pop()
-            if current.checkLose():
-                continue
-            if current.checkWin():
-                return current.getActions(), current, iterations
-            if current.getKey() not in visisted:
-                if bestNode == None or current.getHeuristic() < bestNode.getHeuristic():
-                    bestNode = current
-                elif current.getHeuristic() == bestNode.getHeuristic() and current.getCost() < bestNode.getCost():
-                    bestNode = current
-                visisted.add(current.getKey())
-                queue.extend(current.getChildren())
-        return bestNode.getActions(), bestNode, iterations
-
-class AStarAgent(Agent):
-    def getSolution(self, state, balance=1, maxIterations=-1):
-        iterations = 0
-        bestNode = None
-        Node.balance = balance
-        queue = PriorityQueue()
-        queue.put(Node(state.clone(), None, None))
-        visisted = set()
-        while (iterations < maxIterations or maxIterations <= 0) and queue.qsize() > 0:
-            iterations += 1
-            current = queue.get()
-            if current.checkLose():
-                continue
-            if current.checkWin():
-                return current.getActions(), current, iterations
-            if current.getKey() not in visisted:
-                if bestNode == None or current.getHeuristic() < bestNode.getHeuristic():
-                    bestNode = current
-                elif current.getHeuristic() == bestNode.getHeuristic() and current.getCost() < bestNode.getCost():
-                    bestNode = current
-                visisted.add(current.getKey())
-                children = current.getChildren()
-                for c in children:
-                    queue.put(c)
-        return bestNode.getActions(), bestNode, iterations
+"""
+Get the heuristic of a state from the distance of the player to the door, its health and the
+number of collected treasures
+"""
+def getHeuristicValue(playerDist, health, treasures):
+    return playerDist + 4*(5 - health) - 4*treasures
 
 class State:
     def __init__(self):
@@ -136,6 +19,11 @@ class State:
         self.potions = []
         self.player = None
         self.door = None
+        # the bitmask of the remaining items, the potions come first then the treasures and the enemies
+        self.items = 0
+        self.itemList = None
+        self.tileGrid = None
+        self.itemGrid = None
 
     def stringInitialize(self, lines):
         # clean the input
@@ -187,6 +75,48 @@ class State:
                         self.enemies.append({"x":x, "y":y, "damage":1})
                     if c=="o":
                         self.enemies.append({"x":x, "y":y, "damage":2})
+        self.initializeTables()
+
+    """
+    Initialize the level from a 2D map of tile numbers (0: empty, 1: solid, 2: player, 3: exit,
+    4: potion, 5: treasure, 6: goblin, 7: ogre) surrounded by border cells of solid tiles on every side
+    """
+    def mapInitialize(self, map, border=1):
+        self.width = len(map[0]) + 2*border
+        self.height = len(map) + 2*border
+        self.solid = [[True] * self.width for _ in range(self.height)]
+        for y in range(len(map)):
+            for x in range(len(map[y])):
+                value = int(map[y][x])
+                x1, y1 = x + border, y + border
+                self.solid[y1][x1] = value == 1
+                if value == 2:
+                    self.player={"x":x1, "y":y1, "health":5, "potions":0, "treasures":0, "enemies":0}
+                elif value == 3:
+                    self.door={"x":x1, "y":y1}
+                elif value == 4:
+                    self.potions.append({"x":x1, "y":y1})
+                elif value == 5:
+                    self.treasures.append({"x":x1, "y":y1})
+                elif value == 6 or value == 7:
+                    self.enemies.append({"x":x1, "y":y1, "damage":value - 5})
+        self.initializeTables()
+
+    """
+    Index the potions, treasures and enemies of the level once, they are never removed from the
+    level lists and the items bitmask has the ones that are not collected yet. The item grid has
+    the bit index of the item of every cell (its index in itemList) or -1 and the tile grid has
+    its tile number (4: potion, 5: treasure, 6: goblin, 7: ogre) or 0
+    """
+    def initializeTables(self):
+        self.itemList = self.potions + self.treasures + self.enemies
+        self.tileGrid = [0] * (self.width * self.height)
+        self.itemGrid = [-1] * (self.width * self.height)
+        tiles = [4] * len(self.potions) + [5] * len(self.treasures) + [5 + e["damage"] for e in self.enemies]
+        for index, (tile, item) in enumerate(zip(tiles, self.itemList)):
+            self.tileGrid[item["y"] * self.width + item["x"]] = tile
+            self.itemGrid[item["y"] * self.width + item["x"]] = index
+        self.items = (1 << len(self.itemList)) - 1
 
     def clone(self):
         clone = State()
@@ -197,59 +127,64 @@ class State:
             "health":self.player["health"], "potions": self.player["potions"],
             "treasures":self.player["treasures"],"enemies":self.player["enemies"]}
         clone.door = self.door
-        for p in self.potions:
-            clone.potions.append(p)
-        for t in self.treasures:
-            clone.treasures.append(t)
-        for e in self.enemies:
-            clone.enemies.append(e)
+        clone.potions = self.potions
+        clone.treasures = self.treasures
+        clone.enemies = self.enemies
+        clone.items = self.items
+        clone.itemList = self.itemList
+        clone.tileGrid = self.tileGrid
+        clone.itemGrid = self.itemGrid
         return clone
 
+    def getNextStates(self):
+        children = []
+        for d in directions:
+            childState = self.clone()
+            childState.update(d["x"], d["y"])
+            children.append((d, childState))
+        return children
+
     def checkMovableLocation(self, x, y):
         return not (x < 0 or y < 0 or x >= self.width or y >= self.height or self.solid[y][x])
 
-    def checkPotionLocation(self, x, y):
-        for p in self.potions:
-            if p["x"] == x and p["y"] == y:
-                return p
+    """
+    Get the item at the location if it is not collected yet and its tile is one of the tiles
+    """
+    def _getItem(self, x, y, tiles):
+        cell = y * self.width + x
+        if self.tileGrid[cell] in tiles and self.items >> self.itemGrid[cell] & 1:
+            return self.itemList[self.itemGrid[cell]]
         return None
 
+    def checkPotionLocation(self, x, y):
+        return self._getItem(x, y, (4,))
+
     def checkTreasureLocation(self, x, y):
-        for t in self.treasures:
-            if t["x"] == x and t["y"] == y:
-                return t
-        return None
+        return self._getItem(x, y, (5,))
 
     def checkEnemyLocation(self, x, y):
-        for e in self.enemies:
-            if e["x"] == x and e["y"] == y:
-                return e
-        return None
+        return self._getItem(x, y, (6, 7))
 
     def updatePlayer(self, x, y):
         self.player["x"] = x
         self.player["y"] = y
-        toBeRemoved = self.checkPotionLocation(x, y)
-        if toBeRemoved is not None:
+        cell = y * self.width + x
+        tile = self.tileGrid[cell]
+        if tile == 0 or not self.items >> self.itemGrid[cell] & 1:
+            return
+        self.items ^= 1 << self.itemGrid[cell]
+        if tile == 4:
             self.player["health"] += 2
             self.player["potions"] += 1
             if self.player["health"] > 5:
                 self.player["health"] = 5
-            self.potions.remove(toBeRemoved)
-            return
-        toBeRemoved = self.checkTreasureLocation(x, y)
-        if toBeRemoved is not None:
+        elif tile == 5:
             self.player["treasures"] += 1
-            self.treasures.remove(toBeRemoved)
-            return
-        toBeRemoved = self.checkEnemyLocation(x, y)
-        if toBeRemoved is not None:
+        else:
             self.player["enemies"] += 1
-            self.player["health"] -= toBeRemoved["damage"]
+            self.player["health"] -= tile - 5
             if self.player["health"] < 0:
                 self.player["health"] = 0
-            self.enemies.remove(toBeRemoved)
-            return
 
     def update(self, dirX, dirY):
         if self.checkOver():
@@ -270,23 +205,12 @@ class State:
             self.updatePlayer(newX, newY)
 
     def getKey(self):
-        key = str(self.player["x"]) + "," + str(self.player["y"]) + "," + str(self.player["health"]) + "|"
-        key += str(self.door["x"]) + "," + str(self.door["y"]) + "|"
-        for p in self.potions:
-            key += str(p["x"]) + "," + str(p["y"]) + ","
-        key = key[:-1] + "|"
-        for t in self.treasures:
-            key += str(t["x"]) + "," + str(t["y"]) + ","
-        key = key[:-1] + "|"
-        for e in self.enemies:
-            key += str(e["x"]) + "," + str(e["y"]) + ","
-        return key[:-1]
+        # the level layout never changes so only the player and the remaining items are hashed
+        return (self.player["x"], self.player["y"], self.player["health"], self.items)
 
     def getHeuristic(self):
         playerDist = abs(self.player["x"] - self.door["x"]) + abs(self.player["y"] - self.door["y"])
-        healthCost = 5 - self.player["health"]
-        treasureCost = -self.player["treasures"]
-        return playerDist + 4*healthCost + 4*treasureCost
+        return getHeuristicValue(playerDist, self.player["health"], self.player["treasures"])
 
     def getGameStatus(self):
         gameStatus = "running"
@@ -344,3 +268,146 @@ class State:
                         result += " "
             result += "\n"
         return result[:-1]
+
+"""
+A solver that searches over the points of interest of the level (the player start, the items
+and the door) instead of the grid cells. The shortest paths between every point and the others
+that don't step on any other item or the door are computed once with a breadth first search,
+then a best first search runs over (point, remaining items, health) where walking to an item
+collects it if it is still there or just passes over its empty cell otherwise, so the shortest
+number of steps to every abstract state is the same as on the grid. The search is ordered by a
+lower bound of the best win reachable from every abstract state (the steps to the door, all the
+remaining potions and all the treasures) so the first win it reaches is the best one.
+
+It returns the win with the lowest balance * steps + heuristic (then the fewest steps), which
+is the win an A* search with the same balance looks for. If there is no win or maxIterations
+abstract states are expanded first, it returns the starting state so the next strategies of the
+solver run
+"""
+class PointsOfInterestAgent(Agent):
+    def getSolution(self, state, balance=1, maxIterations=-1, stop=None):
+        self.generated, self.visited = 0, 0
+        width, door = state.width, state.door["y"] * state.width + state.door["x"]
+        cells = [state.player["y"] * width + state.player["x"]] + [i["y"] * width + i["x"] for i in state.itemList]
+        points = cells + [door]
+        # the start cell is empty once the player leaves it so only the items and the door block the paths
+        searches = [self._getSearch(state, cell, set(points[1:])) for cell in cells]
+        paths = [self._getDistances(state, search[0], cell, points) for search, cell in zip(searches, cells)]
+        # the steps to the door through any empty or item cell are a lower bound of the steps left
+        doorDist = self._getSearch(state, door, set())[0]
+        potions = (1 << len(state.potions)) - 1
+        treasures = ((1 << len(state.treasures)) - 1) << len(state.potions)
+
+        start = (0, state.items, state.player["health"])
+        costs, parents = {start: 0}, {start: None}
+        queue = [(0, 0, start)]
+        best = None
+        iterations = 0
+        while len(queue) > 0 and not (stop is not None and stop()):
+            _, steps, current = heapq.heappop(queue)
+            if costs[current] < steps:
+                continue
+            if iterations >= maxIterations and maxIterations > 0:
+                break
+            iterations += 1
+            point, items, health = current
+            if point == len(points) - 1:
+                best = current
+                break
+            self.visited += 1
+            for target, dist in paths[point].items():
+                nextItems, nextHealth = items, health
+                index = target - 1
+                if target < len(points) - 1 and items >> index & 1:
+                    nextItems ^= 1 << index
+                    nextHealth = self._getHealth(state, index, health)
+                    if nextHealth <= 0:
+                        continue
+                if points[target] not in doorDist:
+                    continue
+                child = (target, nextItems, nextHealth)
+                self.generated += 1
+                if steps + dist < costs.get(child, steps + dist + 1):
+                    costs[child] = steps + dist
+                    parents[child] = current
+                    # the lowest value of the win that can be reached from the child, the health
+                    # can't get higher than all the remaining potions and the treasures than all of them
+                    if target == len(points) - 1:
+                        value = getHeuristicValue(0, nextHealth, bin(treasures & ~nextItems).count("1"))
+                    else:
+                        value = getHeuristicValue(0, min(5, nextHealth + 2 * bin(potions & nextItems).count("1")), len(state.treasures))
+                    value += balance * (steps + dist + doorDist[points[target]])
+                    heapq.heappush(queue, (value, steps + dist, child))
+
+        actions = []
+        if best is not None:
+            current = best
+            while parents[current] is not None:
+                parent = parents[current]
+                actions = self._getPath(state, searches[parent[0]], cells[parent[0]], points[current[0]]) + actions
+                current = parent
+        return actions, replayActions(state, actions), iterations
+
+    def _getHealth(self, state, index, health):
+        if index < len(state.potions):
+            return min(health + 2, 5)
+        if index < len(state.potions) + len(state.treasures):
+            return health
+        return max(health - state.itemList[index]["damage"], 0)
+
+    """
+    Get the number of steps from the cell to every point that can be reached without stepping
+    on another point using the distances of the breadth first search from the cell
+    """
+    def _getDistances(self, state, dist, cell, points):
+        result = {}
+        for i, point in enumerate(points[1:], 1):
+            if point == cell:
+                continue
+            steps = [dist[n] for n in self._getNeighbors(state, point) if n in dist]
+            if len(steps) > 0:
+                result[i] = min(steps) + 1
+        return result
+
+    """
+    Get the actions of the shortest path from the cell to the target point using the breadth
+    first search from the cell
+    """
+    def _getPath(self, state, search, cell, target):
+        dist, parents = search
+        neighbors = [n for n in self._getNeighbors(state, target) if n in dist]
+        current = min(neighbors, key=lambda n: dist[n])
+        actions = [self._getDirection(state, current, target)]
+        while current != cell:
+            actions.append(self._getDirection(state, parents[current], current))
+            current = parents[current]
+        actions.reverse()
+        return actions
+
+    """
+    Run a breadth first search from the cell that doesn't step on the blocked cells
+    """
+    def _getSearch(self, state, cell, blocked):
+        dist, parents = {cell: 0}, {cell: None}
+        queue = deque([cell])
+        while len(queue) > 0:
+            current = queue.popleft()
+            for n in self._getNeighbors(state, current):
+                if n not in dist and n not in blocked:
+                    dist[n] = dist[current] + 1
+                    parents[n] = current
+                    queue.append(n)
+        return dist, parents
+
+    def _getNeighbors(self, state, cell):
+        x, y = cell % state.width, cell // state.width
+        neighbors = []
+        for d in directions:
+            if state.checkMovableLocation(x + d["x"], y + d["y"]):
+                neighbors.append((y + d["y"]) * state.width + x + d["x"])
+        return neighbors
+
+    def _getDirection(self, state, cell, target):
+        for d in directions:
+            if cell + d["y"] * state.width + d["x"] == target:
+                return d
@@ -2,8 +2,9 @@ import os
 import numpy as np
 from PIL import Image
 from gym_pcgrl.envs.probs.problem import Problem
-from gym_pcgrl.envs.helper import get_range_reward, get_tile_locations, calc_certain_tile, calc_num_regions
-from gym_pcgrl.envs.probs.mdungeon.engine import State,BFSAgent,AStarAgent
+from gym_pcgrl.envs.helper import get_int_map, get_range_reward, get_tile_locations, calc_certain_tile, calc_num_regions
+from gym_pcgrl.envs.probs.mdungeon.engine import State, PointsOfInterestAgent
+from gym_pcgrl.envs.probs.solver import Solver
 
 """
 Generate a fully connected level for a simple dungeon crawler similar to MiniDungeons 1 (http://minidungeons.com/)
@@ -20,7 +21,11 @@ class MDungeonProblem(Problem):
         self._prob = {"empty":0.4, "solid": 0.4, "player":0.02, "exit":0.02, "potion":0.03, "treasure":0.03, "goblin":0.05, "ogre": 0.05}
         self._border_tile = "solid"
 
-        self._solver_power = 5000
+        # a new wall doesn't open a new path, with solver_replay the last solution is kept if it still works.
+        # the points of interest search (solver_strategies=[("poi", 1), ("astar", 1), ...]) is a lot
+        # faster but it returns a different win than the A* chain, which changes the solution rewards
+        self._solver = Solver([("astar", 1), ("astar", 0.5), ("astar", 0), ("bfs",)], 5000,
+            replay_edits=[("empty", "solid")], agents={"poi": PointsOfInterestAgent})
 
         self._max_enemies = 6
         self._max_potions = 2
@@ -64,12 +69,17 @@ class MDungeonProblem(Problem):
         max_treasures (int): the max amount of treasure that should appear in a level
         target_col_enemies (int): the target amount of killed enemies that the game is considered a success
         target_solution (int): the minimum amount of movement needed to consider the level a success
+        solver_power (int): the maximum number of iterations for every search strategy
+        solver_strategies ((string,any)[]): replace the search strategies, [("idastar", 1)] or [("beam", 100)] use bounded memory
+        solver_time (float): the time budget in milliseconds for solving the level, None for no limit
+        solver_shared (boolean): share one visited table between the search strategies with solver_power as the total budget
+        solver_stats (boolean): record the solver stats of every level, see get_solver_stats
         rewards (dict(string,float)): the weights of each reward change between the new_stats and old_stats
     """
     def adjust_param(self, **kwargs):
         super().adjust_param(**kwargs)
 
-        self._solver_power = kwargs.get('solver_power', self._solver_power)
+        self._solver.adjust_param(**kwargs)
 
         self._max_enemies = kwargs.get('max_enemies', self._max_enemies)
         self._max_potions = kwargs.get('max_potions', self._max_potions)
@@ -89,6 +99,8 @@ class MDungeonProblem(Problem):
 
     Parameters:
         map (string[][]): the input level to run the game on
+        time_budget (float): the time budget in milliseconds for all the search strategies,
+        if it is None the solver_time parameter is used
 
     Returns:
         float: how close you are to winning (0 if you win)
@@ -96,46 +108,17 @@ class MDungeonProblem(Problem):
         dict(string,int): get the status of the best node - "health": the current player health,
         "col_treasures": number of collected treasures, "col_potions": number of collected potions,
         "col_enemies": number of killed enemies
+        boolean: True if the time budget ran out before finding a solution
     """
-    def _run_game(self, map):
-        gameCharacters=" #@H*$go"
-        string_to_char = dict((s, gameCharacters[i]) for i, s in enumerate(self.get_tile_types()))
-        lvlString = ""
-        for x in range(self._width+2):
-            lvlString += "#"
-        lvlString += "\n"
-        for i in range(len(map)):
-            for j in range(len(map[i])):
-                string = map[i][j]
-                if j == 0:
-                    lvlString += "#"
-                lvlString += string_to_char[string]
-                if j == self._width-1:
-                    lvlString += "#\n"
-        for x in range(self._width+2):
-            lvlString += "#"
-        lvlString += "\n"
-
+    def _run_game(self, map, time_budget=None):
         state = State()
-        state.stringInitialize(lvlString.split("\n"))
-
-        aStarAgent = AStarAgent()
-        bfsAgent = BFSAgent()
+        state.mapInitialize(get_int_map(map, self.get_tile_types()))
 
-        sol,solState,iters = aStarAgent.getSolution(state, 1, self._solver_power)
-        if solState.checkWin():
-            return 0, len(sol), solState.getGameStatus()
-        sol,solState,iters = aStarAgent.getSolution(state, 0.5, self._solver_power)
-        if solState.checkWin():
-            return 0, len(sol), solState.getGameStatus()
-        sol,solState,iters = aStarAgent.getSolution(state, 0, self._solver_power)
-        if solState.checkWin():
-            return 0, len(sol), solState.getGameStatus()
-        sol,solState,iters = bfsAgent.getSolution(state, self._solver_power)
+        sol,solState,timeout = self._solver.solve(state, time_budget, map)
         if solState.checkWin():
-            return 0, len(sol), solState.getGameStatus()
+            return 0, len(sol), solState.getGameStatus(), timeout
 
-        return solState.getHeuristic(), 0, solState.getGameStatus()
+        return solState.getHeuristic(), 0, solState.getGameStatus(), timeout
 
     """
     Get the current stats of the map
@@ -146,7 +129,8 @@ class MDungeonProblem(Problem):
         "potions": number of potion tiles, "treasures": number of treasure tiles, "enemies": number of goblin and ogre tiles,
         "reigons": number of connected empty tiles, "col-potions": number of collected potions by a planning agent,
         "col-treasures": number of collected treasures by a planning agent, "col-enemies": number of killed enemies by a planning agent,
-        "dist-win": how close to the win state, "sol-length": length of the solution to win the level
+        "dist-win": how close to the win state, "sol-length": length of the solution to win the level,
+        "solver-timeout": if the solver time budget ran out before finding a solution
     """
     def get_stats(self, map):
         map_locations = get_tile_locations(map, self.get_tile_types())
@@ -161,10 +145,11 @@ class MDungeonProblem(Problem):
             "col-treasures": 0,
             "col-enemies": 0,
             "dist-win": self._width * self._height,
-            "sol-length": 0
+            "sol-length": 0,
+            "solver-timeout": False
         }
         if map_stats["player"] == 1 and map_stats["exit"] == 1 and map_stats["regions"] == 1:
-                map_stats["dist-win"], map_stats["sol-length"], play_stats = self._run_game(map)
+                map_stats["dist-win"], map_stats["sol-length"], play_stats, map_stats["solver-timeout"] = self._solver.cached(map, self.get_tile_types(), lambda: self._run_game(map))
                 map_stats["col-potions"] = play_stats["col_potions"]
                 map_stats["col-treasures"] = play_stats["col_treasures"]
                 map_stats["col-enemies"] = play_stats["col_enemies"]
@@ -20,6 +20,7 @@ class Problem:
         self._border_tile = tiles[0]
         self._tile_size=16
         self._graphics = None
+        self._solver = None
 
     """
     Seeding the used random variable to get the same result. If the seed is None,
@@ -121,6 +122,37 @@ class Problem:
     def get_debug_info(self, new_stats, old_stats):
         raise NotImplementedError('get_debug_info is not implemented')
 
+    """
+    Get the solver stats of the problems that use a solver to check their levels,
+    the solver_stats parameter has to be True to record them
+
+    Returns:
+        dict(string,any): the stats of the "last" solver call and the "total" stats of all
+        the calls or None if the problem has no solver or solver_stats is False
+    """
+    def get_solver_stats(self):
+        if self._solver is None:
+            return None
+        return self._solver.get_stats()
+
+    """
+    Save the record of all the solver calls to a csv or json file based on the file extension
+
+    Parameters:
+        path (string): the file path to save the stats
+    """
+    def dump_solver_stats(self, path):
+        if self._solver is None:
+            raise NotImplementedError('this problem has no solver')
+        self._solver.dump_stats(path)
+
+    """
+    Release the resources of the problem such as the solver process pool
+    """
+    def close(self):
+        if self._solver is not None:
+            self._solver.close()
+
     """
     Get an image on how the map will look like for a specific map
 
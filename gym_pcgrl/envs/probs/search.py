@@ -0,0 +1,352 @@
+"""
+The search core shared by all the game engines. Every engine State has to implement
+clone, getNextStates, getKey, getHeuristic, checkWin and checkLose to be solved by these agents.
+The actions returned by getNextStates can be lists of actions (macro actions) that are expanded
+into single actions when the solution is returned, the cost (depth) of a macro action is its length
+"""
+from collections import deque
+import heapq
+
+"""
+Replay an action sequence from a state without searching, it costs O(len(actions))
+
+Parameters:
+    state (State): the state to start from
+    actions (any[]): the action sequence
+    keys (any[]): the keys of the states of a previous run of the actions (from getActionKeys),
+    if any state of the replay has a different key the replay stops
+
+Returns:
+    Node: a node that has the final state and the length of the actions as its depth, None if
+    the replay didn't go through the same states as the keys
+"""
+def replayActions(state, actions, keys=None):
+    state = state.clone()
+    if keys is not None and (len(keys) != len(actions) + 1 or state.getKey() != keys[0]):
+        return None
+    for i, a in enumerate(actions):
+        state.update(a["x"], a["y"])
+        if keys is not None and state.getKey() != keys[i + 1]:
+            return None
+    node = Node(state, None, None)
+    node.depth = len(actions)
+    return node
+
+"""
+Get the keys of all the states an action sequence goes through from a state, starting with
+the key of the state itself
+
+Returns:
+    any[]: len(actions) + 1 state keys
+"""
+def getActionKeys(state, actions):
+    state = state.clone()
+    keys = [state.getKey()]
+    for a in actions:
+        state.update(a["x"], a["y"])
+        keys.append(state.getKey())
+    return keys
+
+class Node:
+    __slots__ = ("state", "parent", "action", "depth", "f", "_heuristic")
+
+    def __init__(self, state, parent, action):
+        self.state = state
+        self.parent = parent
+        self.action = action
+        self.depth = 0
+        if parent is not None:
+            # the depth is the number of single actions so a macro action costs its length
+            self.depth = parent.depth + 1
+            if isinstance(action, list):
+                self.depth = parent.depth + len(action)
+        self.f = 0
+        self._heuristic = None
+
+    def getChildren(self):
+        children = []
+        for action, childState in self.state.getNextStates():
+            children.append(Node(childState, self, action))
+        return children
+
+    def getKey(self):
+        return self.state.getKey()
+
+    def getCost(self):
+        return self.depth
+
+    def getHeuristic(self):
+        if self._heuristic is None:
+            self._heuristic = self.state.getHeuristic()
+        return self._heuristic
+
+    def checkWin(self):
+        return self.state.checkWin()
+
+    def checkLose(self):
+        return self.state.checkLose()
+
+    def checkOver(self):
+        return self.state.checkOver()
+
+    def getGameStatus(self):
+        return self.state.getGameStatus()
+
+    def getActions(self):
+        actions = []
+        current = self
+        while current.parent is not None:
+            # macro actions (lists of actions) are expanded into the returned sequence
+            if isinstance(current.action, list):
+                actions.extend(reversed(current.action))
+            else:
+                actions.append(current.action)
+            current = current.parent
+        actions.reverse()
+        return actions
+
+    def __str__(self):
+        return str(self.depth) + "," + str(self.getHeuristic()) + "\n" + str(self.state)
+
+    def __lt__(self, other):
+        return self.f < other.f
+
+"""
+A transposition table that can be shared between searches so a search continues from the
+expansions of the previous one instead of starting again from the root. It keeps the lowest
+cost (depth) each state key was expanded with, the unexpanded frontier nodes and the best node
+found so far. If reopen is True a state is expanded again when it is reached with a lower cost
+"""
+class SearchTable:
+    def __init__(self, reopen=True):
+        self.visited = {}
+        self.frontier = []
+        self.bestNode = None
+        self.reopen = reopen
+
+class Agent:
+    def __init__(self):
+        # the counters of the last getSolution call
+        self.generated = 0
+        self.visited = 0
+
+    def getSolution(self, state, maxIterations):
+        return []
+
+    """
+    Keep the node with the lowest heuristic (then the lowest cost) as the fallback result
+    and drop the state of every expanded node that is not needed anymore, only the parent
+    and the action are kept to rebuild the action sequence
+    """
+    def _updateBest(self, bestNode, current):
+        if bestNode is None or current.getHeuristic() < bestNode.getHeuristic():
+            if bestNode is not None:
+                bestNode.state = None
+            return current
+        if current.getHeuristic() == bestNode.getHeuristic() and current.getCost() < bestNode.getCost():
+            bestNode.state = None
+            return current
+        return bestNode
+
+    """
+    Check the stop callable (used for time budgets), the search always expands the root first
+    so there is a best node to return
+    """
+    def _stopped(self, bestNode, stop):
+        return stop is not None and bestNode is not None and stop()
+
+    """
+    Get the table used by the search and the nodes to start from, a new table starts from
+    the root state while a shared table continues from the frontier of the last search
+    """
+    def _start(self, state, table):
+        if table is None:
+            table = SearchTable(reopen=False)
+        if len(table.frontier) == 0 and len(table.visited) == 0:
+            return table, [Node(state.clone(), None, None)]
+        frontier, table.frontier = table.frontier, []
+        return table, frontier
+
+    def _expand(self, current, bestNode):
+        children = current.getChildren()
+        self.generated += len(children)
+        self.visited += 1
+        if current is not bestNode:
+            current.state = None
+        return children
+
+"""
+Breadth first search, the nodes are expanded in order of their cost (depth) and in the order
+they were generated for the same cost. With macro actions that cost more than one it becomes a
+uniform cost search so the first win still has the lowest number of single actions
+"""
+class BFSAgent(Agent):
+    def getSolution(self, state, maxIterations=-1, stop=None, table=None):
+        iterations = 0
+        self.generated, self.visited = 0, 0
+        table, frontier = self._start(state, table)
+        bestNode, visited, reopen = table.bestNode, table.visited, table.reopen
+        # a queue for every cost, they are all the same queue if every action costs one
+        queues = {}
+        for n in sorted(frontier, key=lambda n: n.depth):
+            queues.setdefault(n.depth, deque()).append(n)
+        cost = min(queues, default=0)
+        while (iterations < maxIterations or maxIterations <= 0) and len(queues) > 0 and not self._stopped(bestNode, stop):
+            while cost not in queues:
+                cost += 1
+            queue = queues[cost]
+            current = queue.popleft()
+            if len(queue) == 0:
+                del queues[cost]
+            iterations += 1
+            if current.checkLose():
+                continue
+            if current.checkWin():
+                return current.getActions(), current, iterations
+            key = current.getKey()
+            depth = visited.get(key)
+            if depth is None or (reopen and current.depth < depth):
+                bestNode = self._updateBest(bestNode, current)
+                visited[key] = current.depth
+                for c in self._expand(current, bestNode):
+                    queues.setdefault(c.depth, deque()).append(c)
+        table.frontier, table.bestNode = [n for c in sorted(queues) for n in queues[c]], bestNode
+        return bestNode.getActions(), bestNode, iterations
+
+class DFSAgent(Agent):
+    def getSolution(self, state, maxIterations=-1, stop=None, table=None):
+        iterations = 0
+        self.generated, self.visited = 0, 0
+        table, frontier = self._start(state, table)
+        bestNode, visited, reopen = table.bestNode, table.visited, table.reopen
+        queue = list(frontier)
+        while (iterations < maxIterations or maxIterations <= 0) and len(queue) > 0 and not self._stopped(bestNode, stop):
+            iterations += 1
+            current = queue.pop()
+            if current.checkLose():
+                continue
+            if current.checkWin():
+                return current.getActions(), current, iterations
+            key = current.getKey()
+            depth = visited.get(key)
+            if depth is None or (reopen and current.depth < depth):
+                bestNode = self._updateBest(bestNode, current)
+                visited[key] = current.depth
+                queue.extend(self._expand(current, bestNode))
+        table.frontier, table.bestNode = queue, bestNode
+        return bestNode.getActions(), bestNode, iterations
+
+class AStarAgent(Agent):
+    def getSolution(self, state, balance=1, maxIterations=-1, stop=None, table=None):
+        iterations = 0
+        self.generated, self.visited = 0, 0
+        table, frontier = self._start(state, table)
+        bestNode, visited, reopen = table.bestNode, table.visited, table.reopen
+        queue = list(frontier)
+        for c in queue:
+            c.f = c.getHeuristic() + balance * c.depth
+        heapq.heapify(queue)
+        while (iterations < maxIterations or maxIterations <= 0) and len(queue) > 0 and not self._stopped(bestNode, stop):
+            iterations += 1
+            current = heapq.heappop(queue)
+            if current.checkLose():
+                continue
+            if current.checkWin():
+                return current.getActions(), current, iterations
+            key = current.getKey()
+            depth = visited.get(key)
+            if depth is None or (reopen and current.depth < depth):
+                bestNode = self._updateBest(bestNode, current)
+                visited[key] = current.depth
+                for c in self._expand(current, bestNode):
+                    c.f = c.getHeuristic() + balance * c.depth
+                    heapq.heappush(queue, c)
+        table.frontier, table.bestNode = queue, bestNode
+        return bestNode.getActions(), bestNode, iterations
+
+"""
+Iterative deepening A*, it runs depth first searches bounded by the f value (heuristic plus
+balance times the cost) and raises the bound to the smallest pruned f value after each pass.
+It only keeps the current path and the children of every node on it, so its memory is
+O(depth * branching) states no matter how many iterations it runs, but it can expand the
+same state again in every pass
+"""
+class IDAStarAgent(Agent):
+    def getSolution(self, state, balance=1, maxIterations=-1, stop=None):
+        iterations = 0
+        bestNode = None
+        self.generated, self.visited = 0, 0
+        threshold = None
+        while True:
+            root = Node(state.clone(), None, None)
+            root.f = root.getHeuristic()
+            if threshold is None:
+                threshold = root.f
+            nextThreshold = None
+            frontier = [[root]]
+            path, pathKeys = [], set()
+            while len(frontier) > 0:
+                if len(frontier[-1]) == 0:
+                    frontier.pop()
+                    if len(path) > 0:
+                        pathKeys.remove(path.pop())
+                    continue
+                if (iterations >= maxIterations and maxIterations > 0) or self._stopped(bestNode, stop):
+                    return bestNode.getActions(), bestNode, iterations
+                iterations += 1
+                current = frontier[-1].pop()
+                if current.checkLose():
+                    continue
+                if current.checkWin():
+                    return current.getActions(), current, iterations
+                if current.f > threshold:
+                    if nextThreshold is None or current.f < nextThreshold:
+                        nextThreshold = current.f
+                    continue
+                key = current.getKey()
+                if key in pathKeys:
+                    continue
+                bestNode = self._updateBest(bestNode, current)
+                children = self._expand(current, bestNode)
+                for c in children:
+                    c.f = c.getHeuristic() + balance * c.depth
+                children.sort(reverse=True)
+                frontier.append(children)
+                path.append(key)
+                pathKeys.add(key)
+            if nextThreshold is None:
+                return bestNode.getActions(), bestNode, iterations
+            threshold = nextThreshold
+
+"""
+Beam search, it expands the search one depth at a time and only keeps the width nodes with
+the lowest heuristic from every depth. It keeps O(width * branching) states at any time, the
+visited keys and the state-less parent nodes used to rebuild the actions are bounded by the
+number of iterations
+"""
+class BeamAgent(Agent):
+    def getSolution(self, state, width=100, maxIterations=-1, stop=None):
+        iterations = 0
+        bestNode = None
+        self.generated, self.visited = 0, 0
+        beam = [Node(state.clone(), None, None)]
+        visited = set()
+        while len(beam) > 0:
+            children = []
+            for current in beam:
+                if (iterations >= maxIterations and maxIterations > 0) or self._stopped(bestNode, stop):
+                    return bestNode.getActions(), bestNode, iterations
+                iterations += 1
+                if current.checkLose():
+                    continue
+                if current.checkWin():
+                    return current.getActions(), current, iterations
+                key = current.getKey()
+                if key not in visited:
+                    bestNode = self._updateBest(bestNode, current)
+                    visited.add(key)
+                    children.extend(self._expand(current, bestNode))
+            for c in children:
+                c.f = c.getHeuristic()
+            beam = heapq.nsmallest(width, children)
+        return bestNode.getActions(), bestNode, iterations
@@ -1,133 +1,7 @@
-from queue import PriorityQueue
+import numpy as np
+from gym_pcgrl.envs.probs.search import Agent,BFSAgent,DFSAgent,AStarAgent,replayActions
 
 directions = [{"x":0, "y":0}, {"x":1, "y":0}, {"x":0, "y":-1}, {"x":1, "y":-1}]
-class Node:
-    balance = 0.5
-    def __init__(self, state, parent, action):
-        self.state = state
-        self.parent = parent
-        self.action = action
-        self.depth = 0
-        if self.parent != None:
-            self.depth = parent.depth + 1
-
-    def getChildren(self):
-        children = []
-        for d in directions:
-            childState = self.state.clone()
-            childState.update(d["x"], d["y"])
-            children.append(Node(childState, self, d))
-        return children
-
-    def getKey(self):
-        return self.state.getKey()
-
-    def getCost(self):
-        return self.depth
-
-    def getHeuristic(self):
-        return self.state.getHeuristic()
-
-    def checkWin(self):
-        return self.state.checkWin()
-
-    def checkLose(self):
-        return self.state.checkLose()
-
-    def checkOver(self):
-        return self.state.checkOver()
-
-    def getGameStatus(self):
-        return self.state.getGameStatus()
-
-    def getActions(self):
-        actions = []
-        current = self
-        while(current.parent != None):
-            actions.insert(0,current.action)
-            current = current.parent
-        return actions
-
-    def __str__(self):
-        return str(self.depth) + "," + str(self.state.getHeuristic()) + "\n" + str(self.state)
-
-    def __lt__(self, other):
-        return self.getHeuristic()+Node.balance*self.getCost() < other.getHeuristic()+Node.balance*other.getCost()
-
-class Agent:
-    def getSolution(self, state, maxIterations):
-        return []
-
-class BFSAgent(Agent):
-    def getSolution(self, state, maxIterations=-1):
-        iterations = 0
-        bestNode = None
-        queue = [Node(state.clone(), None, None)]
-        visisted = set()
-        while (iterations < maxIterations or maxIterations <= 0) and len(queue) > 0:
-            iterations += 1
-            current = queue.pop(0)
-            if current.checkLose():
-                continue
-            if current.checkWin():
-                return current.getActions(), current, iterations
-            if current.getKey() not in visisted:
-                if bestNode == None or current.getHeuristic() < bestNode.getHeuristic():
-                    bestNode = current
-                elif current.getHeuristic() == bestNode.getHeuristic() and current.getCost() < bestNode.getCost():
-                    bestNode = current
-                visisted.add(current.getKey())
-                queue.extend(current.getChildren())
-        return bestNode.getActions(), bestNode, iterations
-
-class DFSAgent(Agent):
-    def getSolution(self, state, maxIterations=-1):
-        iterations = 0
-        bestNode = None
-        queue = [Node(state.clone(), None, None)]
-        visisted = set()
-        while (iterations < maxIterations or maxIterations <= 0) and len(queue) > 0:
-            iterations += 1
-            current = queue.pop()
-            if current.checkLose():
-                continue
-            if current.checkWin():
-                return current.getActions(), current, iterations
-            if current.getKey() not in visisted:
-                if bestNode == None or current.getHeuristic() < bestNode.getHeuristic():
-                    bestNode = current
-                elif current.getHeuristic() == bestNode.getHeuristic() and current.getCost() < bestNode.getCost():
-                    bestNode = current
-                visisted.add(current.getKey())
-                queue.extend(current.getChildren())
-        return bestNode.getActions(), bestNode, iterations
-
-class AStarAgent(Agent):
-    def getSolution(self, state, balance=1, maxIterations=-1):
-        iterations = 0
-        bestNode = None
-        Node.balance = balance
-        queue = PriorityQueue()
-        queue.put(Node(state.clone(), None, None))
-        visisted = set()
-        while (iterations < maxIterations or maxIterations <= 0) and queue.qsize() > 0:
-            iterations += 1
-            current = queue.get()
-            if current.checkLose():
-                continue
-            if current.checkWin():
-                return current.getActions(), current, iterations
-            if current.getKey() not in visisted:
-                if bestNode == None or current.getHeuristic() < bestNode.getHeuristic():
-                    bestNode = current
-                elif current.getHeuristic() == bestNode.getHeuristic() and current.getCost() < bestNode.getCost():
-                    bestNode = current
-                visisted.add(current.getKey())
-                children = current.getChildren()
-                for c in children:
-                    queue.put(c)
-        return bestNode.getActions(), bestNode, iterations
-
 class State:
     def __init__(self):
         self.solid = []
@@ -173,22 +47,45 @@ class State:
                 else:
                     self.solid[y].append(False)
                     if c == "@":
-                        self.player = {"x": x, "y": y, "airTime": 0, "jumps": 0, "jump_locs": []}
+                        self.player = {"x": x, "y": y, "airTime": 0, "jumps": 0, "jump_locs": None}
                     if c == "|":
                         self.exit = x
 
+    """
+    Initialize the level from a 2D map of tile numbers where the tile numbers in solid_tiles are
+    solid. The level is padded by padding columns on both sides, the left side has the player
+    start and the floor, the right side has the exit column and the floor
+    """
+    def mapInitialize(self, map, solid_tiles, padding=3):
+        height = len(map)
+        self.width = len(map[0]) + 2*padding
+        self.height = height
+        floor = np.repeat((np.arange(height) >= height - 2).reshape(-1, 1), padding, axis=1)
+        solid = np.concatenate([floor, np.isin(map, solid_tiles), floor], axis=1)
+        solid[height - 3, -2] = True
+        self.solid = solid.tolist()
+        self.player = {"x": 1, "y": height - 3, "airTime": 0, "jumps": 0, "jump_locs": None}
+        self.exit = len(map[0]) + padding + 1
+
     def clone(self):
         clone = State()
         clone.width = self.width
         clone.height = self.height
         clone.solid = self.solid
         clone.exit = self.exit
+        # the jump locations are an immutable (location, previous) chain shared with the clone
         clone.player = {"x":self.player["x"], "y":self.player["y"], "airTime":self.player["airTime"],
-            "jumps":self.player["jumps"], "jump_locs": []}
-        for l in self.player["jump_locs"]:
-            clone.player["jump_locs"].append(l)
+            "jumps":self.player["jumps"], "jump_locs":self.player["jump_locs"]}
         return clone
 
+    def getNextStates(self):
+        children = []
+        for d in directions:
+            childState = self.clone()
+            childState.update(d["x"], d["y"])
+            children.append((d, childState))
+        return children
+
     def checkMovableLocation(self, x, y):
         if y < 0:
             return True
@@ -217,7 +114,7 @@ class State:
             if ground and self.checkMovableLocation(newX, newY-1):
                 self.player["airTime"] = 5
                 self.player["jumps"] += 1
-                self.player["jump_locs"].append((self.player["x"], self.player["y"]))
+                self.player["jump_locs"] = ((self.player["x"], self.player["y"]), self.player["jump_locs"])
         else:
             if self.player["airTime"] > 0:
                 self.player["airTime"] = 1
@@ -237,7 +134,7 @@ class State:
         self.player["y"] = newY
 
     def getKey(self):
-        return str(self.player["x"]) + "," + str(self.player["y"]) + "," + str(self.player["airTime"])
+        return (self.player["x"], self.player["y"], self.player["airTime"])
 
     def getHeuristic(self):
         return self.exit - self.player["x"]
@@ -252,9 +149,21 @@ class State:
             "status": gameStatus,
             "airTime": self.player["airTime"],
             "jumps": self.player["jumps"],
-            "jump_locs": self.player["jump_locs"]
+            "jump_locs": self.getJumpLocations()
         }
 
+    """
+    Get the list of all the jump locations in order from the jump chain
+    """
+    def getJumpLocations(self):
+        locations = []
+        current = self.player["jump_locs"]
+        while current is not None:
+            locations.append(current[0])
+            current = current[1]
+        locations.reverse()
+        return locations
+
     def checkOver(self):
         return self.checkWin() or self.checkLose()
 
@@ -284,3 +193,140 @@ class State:
                         result += " "
             result += "\n"
         return result[:-1]
+
+"""
+An exhaustive solver for the SMB engine. The engine state is only (x, y, airTime) so all the
+configurations fit in a small dense table, the transitions of every configuration for every
+action are computed at once with numpy and a breadth first search over the table finds every
+reachable configuration (it stops at the first depth that reaches the exit). The returned node
+is the closest reachable configuration to the exit (the win if it is reachable) using the fewest
+steps, replayed on the engine to get the jumps. It doesn't need a search budget so maxIterations
+is ignored.
+
+The player never moves left, so the configurations before a column only depend on the columns
+before it. The agent keeps its last search and when the next level only differs from it starting
+at column c, the configurations up to column c-2 are reused and the search continues from them,
+making the cost of a local edit proportional to its distance to the exit. The solver keeps one
+agent per problem so the search is only reused for the levels the same generator keeps editing
+"""
+class ReachabilityAgent(Agent):
+    # the lowest the player can get is 5 cells above the top row (jumping from the top row)
+    _offset = 6
+    _maxAirTime = 6
+
+    def __init__(self):
+        super().__init__()
+        self._lastSearch = None
+
+    def getSolution(self, state, maxIterations=-1, stop=None):
+        self.generated, self.visited = 0, 0
+        solid = np.array(state.solid, dtype=bool)
+        start = self._getIndex(state, state.player["x"], state.player["y"], state.player["airTime"])
+        column = self._getChangedColumn(state, solid, start)
+        if column is None:
+            transitions, xs = self._getTransitions(solid, 0)
+            dist = np.full(len(xs), -1, dtype=np.int32)
+            parent = np.full(len(xs), -1, dtype=np.int64)
+            parentAction = np.zeros(len(xs), dtype=np.int8)
+            dist[start] = 0
+            seeds = np.array([start])
+            lastDepth = 0
+        else:
+            # only the configurations up to column-2 are kept, the ones at column-2 and the
+            # unexpanded last depth of the previous search are the starting frontier
+            transitions, xs, dist, parent, parentAction, lastDepth = self._lastSearch[2:]
+            first = (column - 1) * self._getColumnSize(state)
+            transitions[first:], _ = self._getTransitions(solid, column - 1)
+            dist[first:] = -1
+            seeds = np.flatnonzero((dist >= 0) & ((xs == column - 2) | (dist == lastDepth)))
+        expandable = xs < state.exit
+
+        seedDepths = dist[seeds]
+        seeds = {d: seeds[seedDepths == d] for d in np.unique(seedDepths).tolist()}
+        # no seeds means the edit is after every configuration the last search reached
+        depth, lastSeed = min(seeds, default=lastDepth), max(seeds, default=lastDepth)
+        frontier = seeds.get(depth, np.zeros(0, dtype=np.int64))
+        while (len(frontier) > 0 or depth < lastSeed) and not (stop is not None and stop()):
+            if np.any(~expandable[frontier]):
+                break
+            self.visited += len(frontier)
+            children = transitions[frontier].ravel()
+            self.generated += len(children)
+            children, first = np.unique(children, return_index=True)
+            new = dist[children] < 0
+            children, first = children[new], first[new]
+            depth += 1
+            dist[children] = depth
+            parent[children] = frontier[first // len(directions)]
+            parentAction[children] = first % len(directions)
+            frontier = children
+            if depth in seeds:
+                frontier = np.sort(np.concatenate((children, seeds[depth])))
+        self._lastSearch = (solid, start, transitions, xs, dist, parent, parentAction, depth)
+
+        reached = np.flatnonzero(dist >= 0)
+        best = reached[np.lexsort((reached, dist[reached], state.exit - xs[reached]))[0]]
+        actions = []
+        while best != start:
+            actions.append(directions[parentAction[best]])
+            best = parent[best]
+        actions.reverse()
+        return actions, replayActions(state, actions), self.visited
+
+    """
+    Get the first column where the level is different from the last search or None if the last
+    search can't be reused (a different size or start, or a change too close to the start)
+    """
+    def _getChangedColumn(self, state, solid, start):
+        last = self._lastSearch
+        if last is None or last[0].shape != solid.shape or last[1] != start:
+            return None
+        changed = np.flatnonzero(np.any(last[0] != solid, axis=0))
+        column = state.width + 1
+        if len(changed) > 0:
+            column = changed[0]
+        if column - 2 < state.player["x"]:
+            return None
+        return column
+
+    def _getColumnSize(self, state):
+        return (state.height + self._offset) * self._maxAirTime
+
+    def _getIndex(self, state, x, y, airTime):
+        return (x * (state.height + self._offset) + y + self._offset) * self._maxAirTime + airTime
+
+    """
+    Compute the next configuration index of every configuration starting from firstColumn for
+    every action the same way as State.update, the configurations are indexed by
+    (x * (height + offset) + y + offset) * 6 + airTime so every column is a contiguous block
+    """
+    def _getTransitions(self, solid, firstColumn):
+        offset = self._offset
+        height, width = solid.shape
+        rows, columns = height + offset, width + 1
+        # movable cells: everything above the level is movable, the cells below it and to the right are not
+        movable = np.zeros((rows + 1, columns + 1), dtype=bool)
+        movable[:offset, :] = True
+        movable[offset:rows, :width] = ~solid
+        ground = np.zeros((rows + 1, columns + 1), dtype=bool)
+        ground[offset:rows, :width] = solid
+
+        x, y, airTime = np.meshgrid(np.arange(firstColumn, columns), np.arange(rows), np.arange(self._maxAirTime), indexing="ij")
+        x, y, airTime = x.ravel(), y.ravel(), airTime.ravel()
+        onGround = ground[y + 1, x]
+        transitions = []
+        for d in directions:
+            newX = x
+            if d["x"] > 0:
+                newX = np.where(movable[y, x + 1], x + 1, x)
+            newAirTime = np.where(airTime > 0, 1, airTime)
+            if d["y"] < 0:
+                newAirTime = np.where(onGround & movable[y - 1, newX], 5, airTime)
+            up = movable[y - 1, newX]
+            down = movable[y + 1, newX]
+            rising = newAirTime > 1
+            falling = newAirTime == 0
+            newY = np.where(rising & up, y - 1, np.where(falling & down, y + 1, y))
+            newAirTime = np.where(rising, np.where(up, newAirTime - 1, 1), 0)
+            transitions.append((newX * rows + newY) * self._maxAirTime + newAirTime)
+        return np.stack(transitions, axis=1), x
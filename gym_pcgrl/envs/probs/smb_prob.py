@@ -2,8 +2,9 @@ from PIL import Image
 import os
 import numpy as np
 from gym_pcgrl.envs.probs.problem import Problem
-from gym_pcgrl.envs.helper import get_range_reward, get_tile_locations, calc_certain_tile, get_floor_dist, get_type_grouping, get_changes
-from gym_pcgrl.envs.probs.smb.engine import State,BFSAgent,AStarAgent
+from gym_pcgrl.envs.helper import get_int_map, get_range_reward, get_floor_dist, get_type_grouping, get_changes
+from gym_pcgrl.envs.probs.smb.engine import State, ReachabilityAgent
+from gym_pcgrl.envs.probs.solver import Solver
 
 
 class SMBProblem(Problem):
@@ -14,7 +15,12 @@ class SMBProblem(Problem):
         self._prob = {"empty":0.75, "solid":0.1, "enemy":0.01, "brick":0.04, "question":0.01, "coin":0.02, "tube": 0.02}
         self._border_size = (3, 0)
 
-        self._solver_power = 10000
+        # the engine only sees passable and solid tiles so edits inside each group don't change the level
+        passable, solid = ["empty", "enemy", "coin"], ["solid", "brick", "question", "tube"]
+        # the exhaustive search (solver_strategies=[("reach",)]) is a lot faster but it returns the
+        # shortest solution with different jumps than the A* chain, which changes the jumps rewards
+        self._solver = Solver([("astar", 1), ("astar", 0)], 10000, agents={"reach": ReachabilityAgent},
+            replay_edits=[(a, b) for group in [passable, solid] for a in group for b in group if a != b])
 
         self._min_empty = 900
         self._min_enemies = 10
@@ -38,6 +44,8 @@ class SMBProblem(Problem):
     def adjust_param(self, **kwargs):
         super().adjust_param(**kwargs)
 
+        self._solver.adjust_param(**kwargs)
+
         self._min_empty = kwargs.get('min_empty', self._min_empty)
         self._min_enemies = kwargs.get('min_enemies', self._min_enemies)
         self._max_enemies = kwargs.get('max_enemies', self._max_enemies)
@@ -50,32 +58,21 @@ class SMBProblem(Problem):
                     self._rewards[t] = rewards[t]
 
     def _get_runnable_lvl(self, map):
-        new_map = []
-
-        for y in range(len(map)):
-            new_map.append([])
-            for x in range(3):
-                if y < self._height - 2:
-                    new_map[y].append("empty")
-                else:
-                    new_map[y].append("solid")
-            for x in range(len(map[y])):
-                value = map[y][x]
-                if map[y][x] == "solid" and y < self._height - 2:
-                    value = "solid_above"
-                if map[y][x] == "tube":
-                    if y >= 1 and map[y-1][x] != "tube":
-                        value = "top"
-                    if x >= 1 and map[y][x-1] != "tube":
-                        value += "_left"
-                    else:
-                        value += "_right"
-                new_map[y].append(value)
-            for x in range(3):
-                if y < self._height - 2:
-                    new_map[y].append("empty")
-                else:
-                    new_map[y].append("solid")
+        tiles = self.get_tile_types()
+        names = np.array(tiles + ["solid_above", "top_left", "top_right", "tube_left", "tube_right"])
+        int_map = get_int_map(map, tiles)
+        rows = np.arange(len(map)).reshape(-1, 1)
+        values = np.where((int_map == tiles.index("solid")) & (rows < self._height - 2), len(tiles), int_map)
+        # the tubes are top_ if the tile above isn't a tube and _right if the tile to the left is one
+        tube = int_map == tiles.index("tube")
+        above = np.ones(tube.shape, dtype=bool)
+        above[1:] = tube[:-1]
+        left = np.ones(tube.shape, dtype=bool)
+        left[:, 1:] = tube[:, :-1]
+        values = np.where(tube, len(tiles) + 1 + 2 * above + left, values)
+        padding = np.where(rows < self._height - 2, tiles.index("empty"), tiles.index("solid"))
+        padding = np.repeat(padding, 3, axis=1)
+        new_map = names[np.concatenate([padding, values, padding], axis=1)].tolist()
 
         new_map[-3][1] = "player"
         new_map[-3][-2] = "solid_above"
@@ -87,55 +84,33 @@ class SMBProblem(Problem):
 
         return new_map
 
-    def _run_game(self, map):
-        gameCharacters=" # ## #"
-        string_to_char = dict((s, gameCharacters[i]) for i, s in enumerate(self.get_tile_types()))
-        lvlString = ""
-        for i in range(len(map)):
-            if i < self._height - 3:
-                lvlString += "   "
-            elif i == self._height - 3:
-                lvlString += " @ "
-            else:
-                lvlString += "###"
-            for j in range(len(map[i])):
-                string = map[i][j]
-                lvlString += string_to_char[string]
-            if i < self._height - 3:
-                lvlString += " | "
-            elif i == self._height - 3:
-                lvlString += " # "
-            else:
-                lvlString += "###"
-            lvlString += "\n"
-
+    def _run_game(self, map, time_budget=None):
+        tiles = self.get_tile_types()
         state = State()
-        state.stringInitialize(lvlString.split("\n"))
+        state.mapInitialize(get_int_map(map, tiles), [tiles.index(t) for t in ["solid", "brick", "question", "tube"]])
 
-        aStarAgent = AStarAgent()
-
-        sol,solState,iters = aStarAgent.getSolution(state, 1, self._solver_power)
-        if solState.checkWin():
-            return 0, solState.getGameStatus()
-        sol,solState,iters = aStarAgent.getSolution(state, 0, self._solver_power)
+        sol,solState,timeout = self._solver.solve(state, time_budget, map)
         if solState.checkWin():
-            return 0, solState.getGameStatus()
+            return 0, solState.getGameStatus(), timeout
 
-        return solState.getHeuristic(), solState.getGameStatus()
+        return solState.getHeuristic(), solState.getGameStatus(), timeout
 
     def get_stats(self, map):
-        map_locations = get_tile_locations(map, self.get_tile_types())
+        tiles = self.get_tile_types()
+        int_map = get_int_map(map, tiles)
         map_stats = {
-            "dist-floor": get_floor_dist(map, ["enemy"], ["solid", "brick", "question", "tube_left", "tube_right"]),
-            "disjoint-tubes": get_type_grouping(map, ["tube"], [(-1,0),(1,0)],1,1),
-            "enemies": calc_certain_tile(map_locations, ["enemy"]),
-            "empty": calc_certain_tile(map_locations, ["empty"]),
-            "noise": get_changes(map, False) + get_changes(map, True),
+            # tube_left and tube_right only exist in the runnable level so the tubes are not a floor
+            "dist-floor": get_floor_dist(int_map, [tiles.index("enemy")], [tiles.index(t) for t in ["solid", "brick", "question"]]),
+            "disjoint-tubes": get_type_grouping(int_map, [tiles.index("tube")], [(-1,0),(1,0)],1,1),
+            "enemies": int(np.count_nonzero(int_map == tiles.index("enemy"))),
+            "empty": int(np.count_nonzero(int_map == tiles.index("empty"))),
+            "noise": get_changes(int_map, False) + get_changes(int_map, True),
             "jumps": 0,
             "jumps-dist": 0,
-            "dist-win": 0
+            "dist-win": 0,
+            "solver-timeout": False
         }
-        map_stats["dist-win"], play_stats = self._run_game(map)
+        map_stats["dist-win"], play_stats, map_stats["solver-timeout"] = self._solver.cached(map, tiles, lambda: self._run_game(map))
         map_stats["jumps"] = play_stats["jumps"]
         prev_jump = 0
         value = 0
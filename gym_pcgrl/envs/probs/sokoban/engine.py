@@ -1,130 +1,64 @@
-from queue import PriorityQueue
+from gym_pcgrl.envs.probs.search import BFSAgent,DFSAgent,AStarAgent
 
 directions = [{"x":-1, "y":0}, {"x":1, "y":0}, {"x":0, "y":-1}, {"x":0, "y":1}]
-class Node:
-    balance = 0.5
-    def __init__(self, state, parent, action):
-        self.state = state
-        self.parent = parent
-        self.action = action
-        self.depth = 0
-        if self.parent != None:
-            self.depth = parent.depth + 1
-
-    def getChildren(self):
-        children = []
-        for d in directions:
-            childState = self.state.clone()
-            crateMove = childState.update(d["x"], d["y"])
-            if childState.player["x"] == self.state.player["x"] and childState.player["y"] == self.state.player["y"]:
-                continue
-            if crateMove and childState.checkDeadlock():
-                continue
-            children.append(Node(childState, self, d))
-        return children
-
-    def getKey(self):
-        return self.state.getKey()
-
-    def getCost(self):
-        return self.depth
-
-    def getHeuristic(self):
-        return self.state.getHeuristic()
-
-    def checkWin(self):
-        return self.state.checkWin()
-
-    def getActions(self):
-        actions = []
-        current = self
-        while(current.parent != None):
-            actions.insert(0,current.action)
-            current = current.parent
-        return actions
-
-    def __str__(self):
-        return str(self.depth) + "," + str(self.state.getHeuristic()) + "\n" + str(self.state)
-
-    def __lt__(self, other):
-        return self.getHeuristic()+Node.balance*self.getCost() < other.getHeuristic()+Node.balance*other.getCost()
-
-class Agent:
-    def getSolution(self, state, maxIterations):
-        return []
-
-class BFSAgent(Agent):
-    def getSolution(self, state, maxIterations=-1):
-        iterations = 0
-        bestNode = None
-        queue = [Node(state.clone(), None, None)]
-        visisted = set()
-        while (iterations < maxIterations or maxIterations <= 0) and len(queue) > 0:
-            iterations += 1
-            current = queue.pop(0)
-            if current.checkWin():
-                return current.getActions(), current, iterations
-            if current.getKey() not in visisted:
-                if bestNode == None or current.getHeuristic() < bestNode.getHeuristic():
-                    bestNode = current
-                elif current.getHeuristic() == bestNode.getHeuristic() and current.getCost() < bestNode.getCost():
-                    bestNode = current
-                visisted.add(current.getKey())
-                queue.extend(current.getChildren())
-        return bestNode.getActions(), bestNode, iterations
-
-class DFSAgent(Agent):
-    def getSolution(self, state, maxIterations=-1):
-        iterations = 0
-        bestNode = None
-        queue = [Node(state.clone(), None, None)]
-        visisted = set()
-        while (iterations < maxIterations or maxIterations <= 0) and len(queue) > 0:
-            iterations += 1
-            current = queue.pop()
-            if current.checkWin():
-                return current.getActions(), current, iterations
-            if current.getKey() not in visisted:
-                if bestNode == None or current.getHeuristic() < bestNode.getHeuristic():
-                    bestNode = current
-                elif current.getHeuristic() == bestNode.getHeuristic() and current.getCost() < bestNode.getCost():
-                    bestNode = current
-                visisted.add(current.getKey())
-                queue.extend(current.getChildren())
-        return bestNode.getActions(), bestNode, iterations
-
-class AStarAgent(Agent):
-    def getSolution(self, state, balance=1, maxIterations=-1):
-        iterations = 0
-        bestNode = None
-        Node.balance = balance
-        queue = PriorityQueue()
-        queue.put(Node(state.clone(), None, None))
-        visisted = set()
-        while (iterations < maxIterations or maxIterations <= 0) and queue.qsize() > 0:
-            iterations += 1
-            # queue = sorted(queue, key=lambda node: balance*node.getCost() + node.getHeuristic())
-            current = queue.get()
-            if current.checkWin():
-                return current.getActions(), current, iterations
-            if current.getKey() not in visisted:
-                if bestNode == None or current.getHeuristic() < bestNode.getHeuristic():
-                    bestNode = current
-                elif current.getHeuristic() == bestNode.getHeuristic() and current.getCost() < bestNode.getCost():
-                    bestNode = current
-                visisted.add(current.getKey())
-                children = current.getChildren()
-                for c in children:
-                    queue.put(c)
-        return bestNode.getActions(), bestNode, iterations
+# the dead squares and push distances of every (width, solid, targets) layout, the generator
+# keeps editing the same levels
+_layoutCache = {}
+
+"""
+Get the minimum cost of assigning every row to a different column using the hungarian
+algorithm, the cost matrix can't have more rows than columns
+"""
+def _getMatchingCost(cost):
+    n, m = len(cost), len(cost[0])
+    u, v, match, way = [0] * (n + 1), [0] * (m + 1), [0] * (m + 1), [0] * (m + 1)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        minValues = [float("inf")] * (m + 1)
+        used = [False] * (m + 1)
+        while match[j0] != 0:
+            used[j0] = True
+            i0, delta, j1 = match[j0], float("inf"), 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    value = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                    if value < minValues[j]:
+                        minValues[j], way[j] = value, j0
+                    if minValues[j] < delta:
+                        delta, j1 = minValues[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    minValues[j] -= delta
+            j0 = j1
+        while j0 != 0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+    return -v[0]
 
 class State:
+    # the cells are flat indices (y * width + x), the static grids (solid, targets, deadlocks,
+    # distances) are shared by reference between all the clones and only the player and crates
+    # change, the heuristic is kept by the clones till a crate is pushed
+    __slots__ = ("width", "height", "solid", "targets", "targetKey", "deadlocks", "distances",\
+        "player", "crates", "crateKey", "heuristic")
+
     def __init__(self):
-        self.solid=[]
-        self.deadlocks = []
-        self.targets=[]
-        self.crates=[]
+        self.width=0
+        self.height=0
+        self.solid=()
+        self.targets=()
+        self.targetKey=0
+        self.deadlocks=0
+        self.distances=()
         self.player=None
+        self.crates=()
+        self.crateKey=0
+        self.heuristic=None
 
     def randomInitialize(self, width, height):
         self.width-width
@@ -133,9 +67,6 @@ class State:
         return
 
     def stringInitialize(self, lines):
-        self.solid=[]
-        self.targets=[]
-        self.crates=[]
         self.player=None
 
         # clean the input
@@ -163,135 +94,238 @@ class State:
                 self.width = len(l)
 
         #set the level
+        solid=[]
+        targets=[]
+        crates=[]
+        self.targetKey=0
+        self.crateKey=0
         for y in range(self.height):
             l = lines[y]
-            self.solid.append([])
             for x in range(self.width):
                 if x > len(l)-1:
-                    self.solid[y].append(False)
+                    solid.append(False)
                     continue
                 c=l[x]
                 if c == "#":
-                    self.solid[y].append(True)
+                    solid.append(True)
                 else:
-                    self.solid[y].append(False)
+                    solid.append(False)
                     if c == "@" or c=="+":
-                        self.player={"x":x, "y":y}
+                        self.player=y*self.width+x
                     if c=="$" or c=="*":
-                        self.crates.append({"x":x, "y":y})
+                        crates.append(y*self.width+x)
+                        self.crateKey |= 1 << (y*self.width+x)
                     if c=="." or c=="+" or c=="*":
-                        self.targets.append({"x":x, "y":y})
+                        targets.append(y*self.width+x)
+                        self.targetKey |= 1 << (y*self.width+x)
+        self.solid=tuple(solid)
+        self.targets=tuple(targets)
+        self.crates=tuple(crates)
+        self.heuristic=None
+        self.intializeDeadlocks()
+
+    """
+    Initialize the level from a 2D map of tile numbers (0: empty, 1: solid, 2: player,
+    3: crate, 4: target) surrounded by border cells of solid tiles on every side
+    """
+    def mapInitialize(self, map, border=1):
+        self.width=len(map[0])+2*border
+        self.height=len(map)+2*border
+        solid=[True]*(self.width*self.height)
+        targets=[]
+        crates=[]
+        self.player=None
+        self.targetKey=0
+        self.crateKey=0
+        for y in range(len(map)):
+            for x in range(len(map[y])):
+                c=(y+border)*self.width+x+border
+                value=int(map[y][x])
+                solid[c]=value == 1
+                if value == 2:
+                    self.player=c
+                elif value == 3:
+                    crates.append(c)
+                    self.crateKey |= 1 << c
+                elif value == 4:
+                    targets.append(c)
+                    self.targetKey |= 1 << c
+        self.solid=tuple(solid)
+        self.targets=tuple(targets)
+        self.crates=tuple(crates)
+        self.heuristic=None
         self.intializeDeadlocks()
 
     def clone(self):
-        clone=State()
+        clone=type(self).__new__(type(self))
         clone.width = self.width
         clone.height = self.height
-        # since the solid is not changing then copy by value
+        # the static grids and the immutable crates tuple are shared by reference
         clone.solid = self.solid
+        clone.targets = self.targets
+        clone.targetKey = self.targetKey
         clone.deadlocks = self.deadlocks
-        clone.player={"x":self.player["x"], "y":self.player["y"]}
-
-        for t in self.targets:
-            clone.targets.append({"x":t["x"], "y":t["y"]})
-
-        for c in self.crates:
-            clone.crates.append({"x":c["x"], "y":c["y"]})
-
+        clone.distances = self.distances
+        clone.player = self.player
+        clone.crates = self.crates
+        clone.crateKey = self.crateKey
+        clone.heuristic = self.heuristic
         return clone
 
+    def getNextStates(self):
+        children = []
+        if self.checkWin():
+            return children
+        for d in directions:
+            x, y = self.player % self.width + d["x"], self.player // self.width + d["y"]
+            if self.checkMovableLocation(x, y):
+                childState = self.clone()
+                childState.player = y * self.width + x
+            elif self.checkCrateLocation(x, y) and self.checkMovableLocation(x + d["x"], y + d["y"]):
+                childState = self.clone()
+                childState.update(d["x"], d["y"])
+                if childState.checkDeadlock((y + d["y"]) * self.width + x + d["x"]):
+                    continue
+            else:
+                continue
+            children.append((d, childState))
+        return children
+
+    """
+    Find the push distance from every cell to every target and mark the dead squares, the
+    squares where a crate can never be pushed to any target. The distances are found by pulling
+    a crate from every target in the reverse direction, a crate can be pulled from a cell to its
+    neighbor if the player has space to stand behind it. The cells that can't reach a target
+    get width * height as their distance
+    """
     def intializeDeadlocks(self):
-        sign = lambda x: int(x/max(1,abs(x)))
+        key = (self.width, self.solid, self.targets)
+        layout = _layoutCache.get(key)
+        if layout is None:
+            unreachable = self.width * self.height
+            distances = []
+            for t in self.targets:
+                dist = [unreachable] * (self.width * self.height)
+                dist[t] = 0
+                queue = [t]
+                for c in queue:
+                    x, y = c % self.width, c // self.width
+                    for d in directions:
+                        if self.checkOutside(x + 2*d["x"], y + 2*d["y"]):
+                            continue
+                        pulled = (y + d["y"]) * self.width + x + d["x"]
+                        player = (y + 2*d["y"]) * self.width + x + 2*d["x"]
+                        if self.solid[pulled] or self.solid[player] or dist[pulled] != unreachable:
+                            continue
+                        dist[pulled] = dist[c] + 1
+                        queue.append(pulled)
+                distances.append(dist)
+            deadlocks = 0
+            for i in range(self.width * self.height):
+                if not self.solid[i] and all(dist[i] == unreachable for dist in distances):
+                    deadlocks |= 1 << i
+            if len(_layoutCache) >= 1024:
+                _layoutCache.clear()
+            layout = (deadlocks, distances)
+            _layoutCache[key] = layout
+        self.deadlocks, self.distances = layout
+
+    """
+    Check if any crate is on a dead square or if the pushed crate got frozen, a crate is frozen
+    if it can't move horizontally nor vertically because of walls, dead squares or other frozen
+    crates. Frozen crates are only a deadlock if one of them is not on a target
+    """
+    def checkDeadlock(self, crate=None):
+        if self.crateKey & self.deadlocks != 0:
+            return True
+        if crate is None:
+            return False
+        frozen = []
+        if not self._checkFrozen(crate, frozenset(), frozen):
+            return False
+        for c in frozen:
+            if (self.targetKey >> c) & 1 == 0:
+                return True
+        return False
 
-        self.deadlocks = []
-        for y in range(self.height):
-            self.deadlocks.append([])
-            for x in range(self.width):
-                self.deadlocks[y].append(False)
+    def _checkFrozen(self, crate, walls, frozen):
+        # the crate is treated as a wall while checking its neighbors to avoid cycles
+        walls = walls | {crate}
+        x, y = crate % self.width, crate // self.width
+        if not self._checkBlocked(crate, 1, x == 0 or x == self.width - 1, walls, frozen):
+            return False
+        if not self._checkBlocked(crate, self.width, y == 0 or y == self.height - 1, walls, frozen):
+            return False
+        frozen.append(crate)
+        return True
 
-        corners = []
-        for y in range(self.height):
-            for x in range(self.width):
-                if x == 0 or y == 0 or x == self.width - 1 or y == self.height - 1 or self.solid[y][x]:
-                    continue
-                if (self.solid[y-1][x] and self.solid[y][x-1]) or (self.solid[y-1][x] and self.solid[y][x+1]) or (self.solid[y+1][x] and self.solid[y][x-1]) or (self.solid[y+1][x] and self.solid[y][x+1]):
-                    if not self.checkTargetLocation(x, y):
-                        corners.append({"x":x, "y":y})
-                        self.deadlocks[y][x] = True
-
-        for c1 in corners:
-            for c2 in corners:
-                dx,dy = sign(c1["x"] - c2["x"]), sign(c1["y"] - c2["y"])
-                if (dx == 0 and dy == 0) or (dx != 0 and dy != 0):
-                    continue
-                walls = []
-                x,y=c2["x"],c2["y"]
-                if dx != 0:
-                    x += dx
-                    while x != c1["x"]:
-                        if self.checkTargetLocation(x,y) or self.solid[y][x] or (not self.solid[y-1][x] and not self.solid[y+1][x]):
-                            walls = []
-                            break
-                        walls.append({"x":x, "y":y})
-                        x += dx
-                if dy != 0:
-                    y += dy
-                    while y != c1["y"]:
-                        if self.checkTargetLocation(x,y) or self.solid[y][x] or (not self.solid[y][x-1] and not self.solid[y][x+1]):
-                            walls = []
-                            break
-                        walls.append({"x":x, "y":y})
-                        y += dy
-                for w in walls:
-                    self.deadlocks[w["y"]][w["x"]] = True
-
-    def checkDeadlock(self):
-        for c in self.crates:
-            if self.deadlocks[c["y"]][c["x"]]:
+    def _checkBlocked(self, crate, axis, border, walls, frozen):
+        if border:
+            return True
+        sides = (crate - axis, crate + axis)
+        for c in sides:
+            if self.solid[c] or c in walls:
+                return True
+        if (self.deadlocks >> sides[0]) & 1 and (self.deadlocks >> sides[1]) & 1:
+            return True
+        for c in sides:
+            if (self.crateKey >> c) & 1 and self._checkFrozen(c, walls, frozen):
                 return True
         return False
 
     def checkOutside(self, x, y):
-        return x < 0 or y < 0 or x > len(self.solid[0]) - 1 or y > len(self.solid) - 1
+        return x < 0 or y < 0 or x > self.width - 1 or y > self.height - 1
 
     def checkTargetLocation(self, x, y):
-        for t in self.targets:
-            if t["x"] == x and t["y"] == y:
-                return t
-        return None
+        return (self.targetKey >> (y*self.width+x)) & 1 == 1
 
     def checkCrateLocation(self, x, y):
-        for c in self.crates:
-            if c["x"] == x and c["y"] == y:
-                return c
-        return None
+        return (self.crateKey >> (y*self.width+x)) & 1 == 1
 
     def checkMovableLocation(self, x, y):
-        return not self.checkOutside(x, y) and not self.solid[y][x] and self.checkCrateLocation(x,y) is None
+        return not self.checkOutside(x, y) and not self.solid[y*self.width+x] and not self.checkCrateLocation(x,y)
 
     def checkWin(self):
         if len(self.targets) != len(self.crates) or len(self.targets) == 0 or len(self.crates) == 0:
             return False
+        return self.crateKey == self.targetKey
 
-        for t in self.targets:
-            if self.checkCrateLocation(t["x"], t["y"]) is None:
-                return False
-
-        return True
+    def checkLose(self):
+        return False
 
+    """
+    The minimum total push distance over all the assignments of crates to different targets,
+    it only changes when a crate is pushed so it is cached and kept by the clones till then
+    """
     def getHeuristic(self):
-        targets=[]
-        for t in self.targets:
-            targets.append(t)
+        if self.heuristic is None:
+            cost = [[dist[c] for dist in self.distances] for c in self.crates]
+            if len(cost) == 0 or len(self.targets) == 0:
+                self.heuristic = 0
+            elif len(self.crates) <= len(self.targets):
+                self.heuristic = _getMatchingCost(cost)
+            else:
+                self.heuristic = _getMatchingCost([list(row) for row in zip(*cost)])
+        return self.heuristic
+
+    """
+    The total manhattan distance of the crates to the targets where every crate greedily takes
+    the nearest free target, it is the distance to win reported by the problem. The search uses
+    the push distances of getHeuristic instead, they are higher and the dead squares get
+    width * height so they don't keep the scale of this value
+    """
+    def getWinDistance(self):
+        targets=[(t % self.width, t // self.width) for t in self.targets]
         distance=0
         for c in self.crates:
+            cx, cy = c % self.width, c // self.width
             bestDist = self.width + self.height
             bestMatch = 0
-            for i,t in enumerate(targets):
-                if bestDist > abs(c["x"] - t["x"]) + abs(c["y"] - t["y"]):
+            for i,(tx,ty) in enumerate(targets):
+                if bestDist > abs(cx - tx) + abs(cy - ty):
                     bestMatch = i
-                    bestDist = abs(c["x"] - t["x"]) + abs(c["y"] - t["y"])
-            distance += abs(targets[bestMatch]["x"] - c["x"]) + abs(targets[bestMatch]["y"] - c["y"])
+                    bestDist = abs(cx - tx) + abs(cy - ty)
+            distance += abs(targets[bestMatch][0] - cx) + abs(targets[bestMatch][1] - cy)
             del targets[bestMatch]
         return distance
 
@@ -308,42 +342,38 @@ class State:
             dirY=1
         if dirY < 0:
             dirY=-1
-        newX=self.player["x"]+dirX
-        newY=self.player["y"]+dirY
+        newX=self.player % self.width+dirX
+        newY=self.player // self.width+dirY
         if self.checkMovableLocation(newX, newY):
-            self.player["x"]=newX
-            self.player["y"]=newY
-        else:
-            crate=self.checkCrateLocation(newX,newY)
-            if crate is not None:
-                crateX=crate["x"]+dirX
-                crateY=crate["y"]+dirY
-                if self.checkMovableLocation(crateX,crateY):
-                    self.player["x"]=newX
-                    self.player["y"]=newY
-                    crate["x"]=crateX
-                    crate["y"]=crateY
-                    return True
+            self.player=newY*self.width+newX
+        elif not self.checkOutside(newX, newY) and self.checkCrateLocation(newX,newY):
+            crateX=newX+dirX
+            crateY=newY+dirY
+            if self.checkMovableLocation(crateX,crateY):
+                crate=newY*self.width+newX
+                self.player=crate
+                self.crateKey ^= (1 << crate) | (1 << (crateY*self.width+crateX))
+                self.crates=tuple(crateY*self.width+crateX if c == crate else c for c in self.crates)
+                self.heuristic=None
+                return True
         return False
 
     def getKey(self):
-        key=str(self.player["x"]) + "," + str(self.player["y"]) + "," + str(len(self.crates)) + "," + str(len(self.targets))
-        for c in self.crates:
-            key += "," + str(c["x"]) + "," + str(c["y"]);
-        for t in self.targets:
-            key += "," + str(t["x"]) + "," + str(t["y"]);
-        return key
+        # targets never move so the player and crate cells identify the state, the crates are kept
+        # in their order so the same crates in a different order are still different states and
+        # the search picks the same best node as with the old string keys
+        return (self.player, self.crates)
 
     def __str__(self):
         result = ""
         for y in range(self.height):
             for x in range(self.width):
-                if self.solid[y][x]:
+                if self.solid[y*self.width+x]:
                     result += "#"
                 else:
-                    crate=self.checkCrateLocation(x,y) is not None
-                    target=self.checkTargetLocation(x,y) is not None
-                    player=self.player["x"]==x and self.player["y"]==y
+                    crate=self.checkCrateLocation(x,y)
+                    target=self.checkTargetLocation(x,y)
+                    player=self.player==y*self.width+x
                     if crate:
                         if target:
                             result += "*"
@@ -361,3 +391,93 @@ class State:
                             result += " "
             result += "\n"
         return result[:-1]
+
+"""
+A Sokoban state that is searched one push at a time, the successors are all the crate pushes
+from the cells the player can walk to and every action is the shortest walk followed by the
+push. The states are keyed by the crates and the player cell (the cell of the pushed crate), the
+walk costs its number of steps so a search ordered by cost finds the fewest steps like the
+step by step State
+"""
+class PushState(State):
+    # neighbors and pushes are static tables of (cell, direction) and (crate cell, new crate cell,
+    # direction) for every cell, reachable is the flood fill of the player cached for the state
+    __slots__ = ("neighbors", "pushes", "reachable")
+
+    def stringInitialize(self, lines):
+        super().stringInitialize(lines)
+        self._initializeTables()
+
+    def mapInitialize(self, map, border=1):
+        super().mapInitialize(map, border)
+        self._initializeTables()
+
+    def _initializeTables(self):
+        self.neighbors = []
+        self.pushes = []
+        for c in range(self.width * self.height):
+            x, y = c % self.width, c // self.width
+            self.neighbors.append([])
+            self.pushes.append([])
+            for d in directions:
+                if self.checkOutside(x + d["x"], y + d["y"]) or self.solid[c + d["y"] * self.width + d["x"]]:
+                    continue
+                self.neighbors[c].append((c + d["y"] * self.width + d["x"], d))
+                if self.checkOutside(x + 2*d["x"], y + 2*d["y"]) or self.solid[c + 2 * (d["y"] * self.width + d["x"])]:
+                    continue
+                self.pushes[c].append((c + d["y"] * self.width + d["x"], c + 2 * (d["y"] * self.width + d["x"]), d))
+        self.reachable = None
+
+    def clone(self):
+        clone = super().clone()
+        clone.neighbors = self.neighbors
+        clone.pushes = self.pushes
+        clone.reachable = None
+        return clone
+
+    def update(self, dirX, dirY):
+        self.reachable = None
+        return super().update(dirX, dirY)
+
+    def getNextStates(self):
+        children = []
+        if self.checkWin():
+            return children
+        parents = self._getReachable()
+        for cell in parents:
+            for crate, newCrate, d in self.pushes[cell]:
+                if (self.crateKey >> crate) & 1 == 0 or (self.crateKey >> newCrate) & 1 == 1:
+                    continue
+                childState = self.clone()
+                childState.player = crate
+                childState.crateKey ^= (1 << crate) | (1 << newCrate)
+                childState.crates = tuple(newCrate if c == crate else c for c in self.crates)
+                childState.heuristic = None
+                if childState.checkDeadlock(newCrate):
+                    continue
+                children.append((self._getPath(parents, cell) + [d], childState))
+        return children
+
+    """
+    Flood fill the cells the player can walk to without pushing, it returns the cell that
+    every reachable cell was reached from and the direction used in the order they are reached
+    """
+    def _getReachable(self):
+        if self.reachable is None:
+            parents = {self.player: None}
+            queue = [self.player]
+            for c in queue:
+                for n, d in self.neighbors[c]:
+                    if n not in parents and (self.crateKey >> n) & 1 == 0:
+                        parents[n] = (c, d)
+                        queue.append(n)
+            self.reachable = parents
+        return self.reachable
+
+    def _getPath(self, parents, cell):
+        path = []
+        while parents[cell] is not None:
+            cell, d = parents[cell]
+            path.append(d)
+        path.reverse()
+        return path
@@ -2,8 +2,9 @@ import os
 from PIL import Image
 import numpy as np
 from gym_pcgrl.envs.probs.problem import Problem
-from gym_pcgrl.envs.helper import get_range_reward, get_tile_locations, calc_certain_tile, calc_num_regions
-from gym_pcgrl.envs.probs.sokoban.engine import State,BFSAgent,AStarAgent
+from gym_pcgrl.envs.helper import get_int_map, get_range_reward, get_tile_locations, calc_certain_tile, calc_num_regions
+from gym_pcgrl.envs.probs.sokoban.engine import State, PushState
+from gym_pcgrl.envs.probs.solver import Solver
 
 """
 Generate a fully connected Sokoban(https://en.wikipedia.org/wiki/Sokoban) level that can be solved
@@ -19,7 +20,10 @@ class SokobanProblem(Problem):
         self._prob = {"empty":0.45, "solid":0.4, "player": 0.05, "crate": 0.05, "target": 0.05}
         self._border_tile = "solid"
 
-        self._solver_power = 5000
+        # a new wall doesn't open a new path, with solver_replay the last solution is kept if it still works
+        self._solver = Solver([("bfs",), ("astar", 1), ("astar", 0.5), ("astar", 0)], 5000,
+            replay_edits=[("empty", "solid")])
+        self._solver_push = False
 
         self._max_crates = 3
 
@@ -55,12 +59,20 @@ class SokobanProblem(Problem):
         max_crates or max_targets (int): the max number of crates or target both
         suppose to be the same value so setting one is enough
         target_solution (int): the target solution length that the level is considered a success if reached
+        solver_power (int): the maximum number of iterations for every search strategy
+        solver_strategies ((string,any)[]): replace the search strategies, [("idastar", 1)] or [("beam", 100)] use bounded memory
+        solver_time (float): the time budget in milliseconds for solving the level, None for no limit
+        solver_shared (boolean): share one visited table between the search strategies with solver_power as the total budget
+        solver_stats (boolean): record the solver stats of every level, see get_solver_stats
+        solver_push (boolean): search the crate pushes instead of the player steps, it expands a lot
+        fewer states and the breadth first search still finds the solution with the fewest steps
         rewards (dict(string,float)): the weights of each reward change between the new_stats and old_stats
     """
     def adjust_param(self, **kwargs):
         super().adjust_param(**kwargs)
 
-        self._solver_power = kwargs.get('solver_power', self._solver_power)
+        self._solver.adjust_param(**kwargs)
+        self._solver_push = kwargs.get('solver_push', self._solver_push)
         self._max_crates = kwargs.get('max_crates', self._max_crates)
         self._max_crates = kwargs.get('max_targets', self._max_crates)
 
@@ -77,49 +89,24 @@ class SokobanProblem(Problem):
 
     Parameters:
         map (string[][]): the input level to run the game on
+        time_budget (float): the time budget in milliseconds for all the search strategies,
+        if it is None the solver_time parameter is used
 
     Returns:
         float: how close you are to winning (0 if you win)
-        int: the solution length if you win (0 otherwise)
-    """
-    def _run_game(self, map):
-        gameCharacters=" #@$."
-        string_to_char = dict((s, gameCharacters[i]) for i, s in enumerate(self.get_tile_types()))
-        lvlString = ""
-        for x in range(self._width+2):
-            lvlString += "#"
-        lvlString += "\n"
-        for i in range(len(map)):
-            for j in range(len(map[i])):
-                string = map[i][j]
-                if j == 0:
-                    lvlString += "#"
-                lvlString += string_to_char[string]
-                if j == self._width-1:
-                    lvlString += "#\n"
-        for x in range(self._width+2):
-            lvlString += "#"
-        lvlString += "\n"
-
+        any[]: the solution actions if you win (empty otherwise)
+        boolean: True if the time budget ran out before finding a solution
+    """
+    def _run_game(self, map, time_budget=None):
         state = State()
-        state.stringInitialize(lvlString.split("\n"))
-
-        aStarAgent = AStarAgent()
-        bfsAgent = BFSAgent()
+        if self._solver_push:
+            state = PushState()
+        state.mapInitialize(get_int_map(map, self.get_tile_types()))
 
-        sol,solState,iters = bfsAgent.getSolution(state, self._solver_power)
-        if solState.checkWin():
-            return 0, sol
-        sol,solState,iters = aStarAgent.getSolution(state, 1, self._solver_power)
-        if solState.checkWin():
-            return 0, sol
-        sol,solState,iters = aStarAgent.getSolution(state, 0.5, self._solver_power)
-        if solState.checkWin():
-            return 0, sol
-        sol,solState,iters = aStarAgent.getSolution(state, 0, self._solver_power)
+        sol,solState,timeout = self._solver.solve(state, time_budget, map)
         if solState.checkWin():
-            return 0, sol
-        return solState.getHeuristic(), []
+            return 0, sol, timeout
+        return solState.state.getWinDistance(), [], timeout
 
     """
     Get the current stats of the map
@@ -128,7 +115,8 @@ class SokobanProblem(Problem):
         dict(string,any): stats of the current map to be used in the reward, episode_over, debug_info calculations.
         The used status are "player": number of player tiles, "crate": number of crate tiles,
         "target": number of target tiles, "reigons": number of connected empty tiles,
-        "dist-win": how close to the win state, "sol-length": length of the solution to win the level
+        "dist-win": how close to the win state, "sol-length": length of the solution to win the level,
+        "solver-timeout": if the solver time budget ran out before finding a solution
     """
     def get_stats(self, map):
         map_locations = get_tile_locations(map, self.get_tile_types())
@@ -138,10 +126,11 @@ class SokobanProblem(Problem):
             "target": calc_certain_tile(map_locations, ["target"]),
             "regions": calc_num_regions(map, map_locations, ["empty","player","crate","target"]),
             "dist-win": self._width * self._height * (self._width + self._height),
-            "solution": []
+            "solution": [],
+            "solver-timeout": False
         }
         if map_stats["player"] == 1 and map_stats["crate"] == map_stats["target"] and map_stats["crate"] > 0 and map_stats["regions"] == 1:
-                map_stats["dist-win"], map_stats["solution"] = self._run_game(map)
+                map_stats["dist-win"], map_stats["solution"], map_stats["solver-timeout"] = self._solver.cached(map, self.get_tile_types(), lambda: self._run_game(map), (self._solver_push,))
         return map_stats
 
     """
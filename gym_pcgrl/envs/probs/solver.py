@@ -0,0 +1,556 @@
+"""
+A helper module that runs the chain of search strategies used by the game problems
+"""
+import os
+import csv
+import time
+import json
+import hashlib
+import sqlite3
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from gym_pcgrl.envs.helper import get_int_map
+from gym_pcgrl.envs.probs.search import Node, BFSAgent, DFSAgent, AStarAgent, IDAStarAgent, BeamAgent, SearchTable, replayActions, getActionKeys
+
+"""
+The version of the cached solver results, it has to be increased whenever an engine
+change makes the solver return different results for the same level
+"""
+CACHE_VERSION = 11
+
+"""
+Private function that runs a single strategy on the state
+
+Parameters:
+    state (State): the starting state of the game
+    strategy ((string,any)): the strategy that need to be run
+    solver_power (int): the maximum number of iterations for the strategy
+    stop (callable): returns True when the search has to stop and return its best node
+    table (SearchTable): the transposition table shared with the previous strategies, it is
+    not used by "idastar" and "beam" as they bound their memory
+    agents (dict(string,Agent)): the game specific agents by strategy name, their getSolution
+    is called with the strategy parameters, maxIterations and stop
+
+Returns:
+    any[]: the action sequence to reach the returned node
+    Node: the winning node or the best node found
+    dict(string,int): the number of iterations, generated nodes and visited states
+"""
+def _run_strategy(state, strategy, solver_power, stop, table=None, agents=None):
+    if agents is not None and strategy[0] in agents:
+        agent = agents[strategy[0]]
+        sol, sol_node, iterations = agent.getSolution(state, *strategy[1:], maxIterations=solver_power, stop=stop)
+    elif strategy[0] == "bfs":
+        agent = BFSAgent()
+        sol, sol_node, iterations = agent.getSolution(state, solver_power, stop=stop, table=table)
+    elif strategy[0] == "dfs":
+        agent = DFSAgent()
+        sol, sol_node, iterations = agent.getSolution(state, solver_power, stop=stop, table=table)
+    elif strategy[0] == "astar":
+        agent = AStarAgent()
+        sol, sol_node, iterations = agent.getSolution(state, strategy[1], solver_power, stop=stop, table=table)
+    elif strategy[0] == "idastar":
+        agent = IDAStarAgent()
+        sol, sol_node, iterations = agent.getSolution(state, strategy[1], solver_power, stop=stop)
+    elif strategy[0] == "beam":
+        agent = BeamAgent()
+        sol, sol_node, iterations = agent.getSolution(state, strategy[1], solver_power, stop=stop)
+    else:
+        raise ValueError("unknown solver strategy: {}".format(strategy[0]))
+    return sol, sol_node, {"iterations": iterations, "generated": agent.generated, "visited": agent.visited}
+
+"""
+Private function to get the name of a strategy used in the solver stats (for example "astar-0.5")
+"""
+def _strategy_name(strategy):
+    return "-".join(str(s) for s in strategy)
+
+"""
+Private function to add the counters of a strategy to the total counters
+"""
+def _add_counters(total, counters):
+    for name in counters:
+        total[name] = total.get(name, 0) + counters[name]
+
+"""
+Private function to check if the node is better than the current best node (lower heuristic
+then lower cost) the same way the agents pick their best node
+"""
+def _is_better(node, best_node):
+    if best_node is None or node.getHeuristic() < best_node.getHeuristic():
+        return True
+    return node.getHeuristic() == best_node.getHeuristic() and node.getCost() < best_node.getCost()
+
+_cancel_event = None
+
+"""
+Private function that initialize every portfolio worker process with the shared cancel event
+"""
+def _init_portfolio_worker(cancel_event):
+    global _cancel_event
+    _cancel_event = cancel_event
+
+"""
+Private callable that stops a portfolio strategy when another one won or the time ran out.
+The shared event is only checked every few calls as it needs a lock between processes
+"""
+class _PortfolioStop:
+    def __init__(self, deadline):
+        self._deadline = deadline
+        self._calls = 0
+
+    def __call__(self):
+        self._calls += 1
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            return True
+        return self._calls % 32 == 0 and _cancel_event.is_set()
+
+"""
+Private function that runs a single strategy inside a portfolio worker process. The nodes
+are not sent back to the main process as they reference the whole search tree, the game
+specific agents are sent as classes and a new agent is used for every call
+
+Returns:
+    any[]: the action sequence to reach the returned node
+    State: the state of the winning node or the best node found
+    int: the depth of the returned node
+"""
+def _run_portfolio_strategy(state, strategy, solver_power, time_budget, agents=None):
+    deadline = None
+    if time_budget is not None:
+        deadline = time.perf_counter() + time_budget / 1000.0
+    if agents is not None:
+        agents = {name: agent() for name, agent in agents.items()}
+    sol, sol_node, counters = _run_strategy(state, strategy, solver_power, _PortfolioStop(deadline), agents=agents)
+    if sol_node.checkWin():
+        _cancel_event.set()
+    return sol, sol_node.state, sol_node.getCost(), counters
+
+"""
+A content addressed cache for the solver results with an in-process LRU tier and an
+optional sqlite tier on disk that can be shared between processes (SubprocVecEnv workers)
+"""
+class SolverCache:
+    """
+    Constructor for the cache
+
+    Parameters:
+        size (int): the maximum number of results kept in the in-process LRU tier
+        path (string): the sqlite file used as the shared tier, None to only use the LRU tier
+    """
+    def __init__(self, size, path=None):
+        self._size = size
+        self._path = path
+        self._lru = OrderedDict()
+        self._db = None
+        self._pid = None
+
+    """
+    Private function to get the sqlite connection, every process opens its own connection
+    as they can't be shared after forking
+    """
+    def _get_db(self):
+        if self._path is None:
+            return None
+        if self._db is None or self._pid != os.getpid():
+            self._db = sqlite3.connect(self._path, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT)")
+            self._db.commit()
+            self._pid = os.getpid()
+        return self._db
+
+    def _put_lru(self, key, value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self._size:
+            self._lru.popitem(last=False)
+
+    """
+    Get a cached value
+
+    Parameters:
+        key (string): the key of the value
+
+    Returns:
+        any: the cached value or None if it is not in the cache
+    """
+    def get(self, key):
+        value = self._lru.get(key)
+        if value is not None:
+            self._lru.move_to_end(key)
+        else:
+            db = self._get_db()
+            if db is None:
+                return None
+            row = db.execute("SELECT value FROM results WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            value = row[0]
+            self._put_lru(key, value)
+        return json.loads(value)
+
+    """
+    Add a value to the cache, the value has to be json serializable
+
+    Parameters:
+        key (string): the key of the value
+        value (any): the value to be cached
+    """
+    def put(self, key, value):
+        value = json.dumps(value)
+        self._put_lru(key, value)
+        db = self._get_db()
+        if db is not None:
+            db.execute("INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)", (key, value))
+            db.commit()
+
+"""
+The solver that runs a chain of search strategies on a game state till one of them wins.
+The strategies are tuples where the first value is the agent name ("bfs", "dfs", "astar",
+"idastar", "beam" or one of the game specific agents) followed by the agent parameters (the
+balance for "astar" and "idastar" and the width for "beam").
+
+"bfs", "dfs" and "astar" keep every generated node with its state till the search ends, so
+their memory grows with solver_power. "idastar" keeps O(depth * branching) states and "beam"
+keeps O(width * branching) states (plus small state-less nodes and keys bounded by solver_power),
+so they should be used when a lot of solvers run in parallel on large levels
+"""
+class Solver:
+    """
+    Constructor for the solver
+
+    Parameters:
+        strategies ((string,any)[]): the chain of strategies in the order they are tried
+        solver_power (int): the maximum number of iterations for every strategy
+        replay_edits ((string,string)[]): the (old tile, new tile) edits that can't open a new
+        path, if solver_replay is on and all the edits since the last solved level are one of them
+        the previous solution is replayed before searching
+        agents (dict(string,type)): game specific agent classes that can be used as strategies
+        by their name, for example an exhaustive solver that only works on one game engine. The
+        solver keeps one agent of every class so they can reuse their last search
+    """
+    def __init__(self, strategies, solver_power, replay_edits=(), agents=None):
+        self._default_strategies = strategies
+        self._strategies = strategies
+        self._solver_power = solver_power
+        self._replay_edits = set(replay_edits)
+        self._agents = agents or {}
+        self._agent_instances = {name: agent() for name, agent in self._agents.items()}
+        self._replay = False
+        self._last_map = None
+        self._last_solution = None
+        self._last_keys = None
+        self._replayed = False
+        self._solver_time = None
+        self._portfolio = False
+        self._pool = None
+        self._cancel_event = None
+        self._cache_size = 1024
+        self._cache_path = None
+        self._cache = SolverCache(self._cache_size)
+        self._shared = False
+        self._stats = False
+        self.reset_stats()
+
+    """
+    Adjust the solver parameters
+
+    Parameters:
+        solver_power (int): the maximum number of iterations for every strategy
+        solver_strategies ((string,any)[]): replace the chain of strategies, for example
+        [("idastar", 1)] or [("beam", 100)] to cap the solver memory, None to use the default chain
+        solver_time (float): the time budget in milliseconds shared by the whole strategy
+        chain, None means no time limit
+        solver_shared (boolean): share one transposition table and best node between the
+        strategies of the chain, every strategy continues from the frontier of the previous one
+        and a state is only expanded again if it is reached with a lower cost. The solver_power
+        becomes the budget of the whole chain, split between the strategies that are left. It is
+        not used with solver_portfolio
+        solver_portfolio (boolean): run all the strategies at the same time in a small process
+        pool and stop as soon as one of them wins. It lowers the time to solve hard levels for
+        offline evaluation and dataset generation but uses one process per strategy, so it
+        can't be used from daemonic processes such as SubprocVecEnv workers
+        solver_replay (boolean): replay the last solution on the new level after small edits
+        instead of searching again. The strategies are capped by solver_power and A* doesn't
+        always find the shortest solution, so a fresh search of the new level can find a shorter
+        solution than the replayed one and the stats can differ from the ones without replay
+        solver_cache (int): the number of solved levels kept in memory, 0 to disable the cache
+        solver_cache_path (string): a sqlite file to share the solved levels between processes
+        and runs, None to only use the in-memory cache
+        solver_stats (boolean): keep a record of every solver call (the strategy that won, the
+        number of iterations, generated nodes, visited states and the elapsed time) that can be
+        read using get_stats and saved using dump_stats
+    """
+    def adjust_param(self, **kwargs):
+        self._solver_power = kwargs.get('solver_power', self._solver_power)
+        if 'solver_strategies' in kwargs:
+            strategies = kwargs.get('solver_strategies')
+            if strategies is None:
+                strategies = self._default_strategies
+            self._strategies = [tuple(s) for s in strategies]
+            self.close()
+        self._solver_time = kwargs.get('solver_time', self._solver_time)
+        self._portfolio = kwargs.get('solver_portfolio', self._portfolio)
+        self._replay = kwargs.get('solver_replay', self._replay)
+        self._shared = kwargs.get('solver_shared', self._shared)
+        self._stats = kwargs.get('solver_stats', self._stats)
+        if not self._portfolio:
+            self.close()
+        cache_size = kwargs.get('solver_cache', self._cache_size)
+        cache_path = kwargs.get('solver_cache_path', self._cache_path)
+        if cache_size != self._cache_size or cache_path != self._cache_path:
+            self._cache_size, self._cache_path = cache_size, cache_path
+            self._cache = None
+            if self._cache_size > 0:
+                self._cache = SolverCache(self._cache_size, self._cache_path)
+
+    """
+    Shutdown the portfolio process pool if it was started
+    """
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+            self._cancel_event = None
+
+    """
+    Get the result of running the game on the map from the cache or run it and cache its result.
+    Only the results a fresh sequential search returns are cached, the ones where the time budget
+    ran out depend on the machine load, the portfolio ones on the strategy that finished first
+    and the replayed ones on the previous level
+
+    Parameters:
+        map (string[][]): the level to run the game on
+        tiles (string[]): a list of all the tiles in order
+        run_game (callable): runs the game and returns a json serializable tuple where the
+        last value is True if the time budget ran out
+        params (tuple): the problem parameters that change the result of run_game
+
+    Returns:
+        tuple: the result of run_game
+    """
+    def cached(self, map, tiles, run_game, params=()):
+        if self._cache is None:
+            return run_game()
+        int_map = get_int_map(map, tiles)
+        hash = hashlib.blake2b(int_map.tobytes(), digest_size=16)
+        hash.update(repr((CACHE_VERSION, int_map.shape, tiles, self._strategies, self._solver_power,\
+            self._shared, params)).encode())
+        key = hash.hexdigest()
+        start = time.perf_counter()
+        result = self._cache.get(key)
+        if result is not None:
+            self._record("cache", None, None, False, {}, start)
+            return tuple(result)
+        self._replayed = False
+        result = run_game()
+        if not result[-1] and not self._portfolio and not self._replayed:
+            self._cache.put(key, result)
+        return result
+
+    """
+    Run the strategy chain on the state till a strategy wins, the time runs out,
+    or all the strategies are tried
+
+    Parameters:
+        state (State): the starting state of the game
+        time_budget (float): the time budget in milliseconds for the whole chain, if it is None
+        the solver_time parameter is used
+        map (string[][]): the level the state was built from, it is used to replay the
+        previous solution if the level only had edits from replay_edits since it was solved
+
+    Returns:
+        any[]: the action sequence to reach the returned node
+        Node: the winning node, the best node found when the time runs out, or the best node of
+        the last strategy otherwise
+        boolean: True if the time budget was exhausted before finding a win
+    """
+    def solve(self, state, time_budget=None, map=None):
+        start = time.perf_counter()
+        if map is not None and self._can_replay(map):
+            # the replay has to go through the same states, an edit on the way can turn a step
+            # into a move that does nothing and still reach the win by another route
+            sol_node = replayActions(state, self._last_solution, self._last_keys)
+            if sol_node is not None and sol_node.checkWin():
+                self._last_map = map
+                self._replayed = True
+                self._record("replay", self._last_solution, sol_node, False, {}, start)
+                return self._last_solution, sol_node, False
+
+        sol, sol_node, timeout, strategy, counters = self._search(state, time_budget)
+        if map is not None:
+            self._last_map, self._last_solution, self._last_keys = None, None, None
+            if self._replay and sol_node.checkWin():
+                self._last_map, self._last_solution = map, sol
+                self._last_keys = getActionKeys(state, sol)
+        self._record(strategy, sol, sol_node, timeout, counters, start)
+        return sol, sol_node, timeout
+
+    """
+    Reset all the solver stats
+    """
+    def reset_stats(self):
+        self._stats_log = []
+        self._last_stats = None
+        self._total_stats = {"calls": 0, "wins": 0, "timeouts": 0, "iterations": 0,
+            "generated": 0, "visited": 0, "elapsed": 0.0, "strategies": {}}
+
+    """
+    Get the stats of the last solver call and the totals of all the calls since the last reset,
+    the strategy of a call is the winning strategy name, "replay" if the last solution was
+    replayed, "cache" if the result was cached or "none" if no strategy won
+
+    Returns:
+        dict(string,any): the "last" call and the "total" stats or None if solver_stats is False
+    """
+    def get_stats(self):
+        if not self._stats:
+            return None
+        return {"last": self._last_stats, "total": self._total_stats}
+
+    """
+    Save the record of all the solver calls since the last reset, a ".csv" path writes
+    one row per call, any other path writes a json file with the calls and the totals
+
+    Parameters:
+        path (string): the file path to save the stats
+    """
+    def dump_stats(self, path):
+        with open(path, "w", newline="") as f:
+            if path.endswith(".csv"):
+                writer = csv.DictWriter(f, fieldnames=["strategy", "win", "timeout", "length",\
+                    "iterations", "generated", "visited", "elapsed"])
+                writer.writeheader()
+                writer.writerows(self._stats_log)
+            else:
+                json.dump({"calls": self._stats_log, "total": self._total_stats}, f, indent=2)
+
+    """
+    Private function to record the stats of a single solver call, the elapsed time is in
+    milliseconds. The win and length are None for cached results
+    """
+    def _record(self, strategy, sol, sol_node, timeout, counters, start):
+        if not self._stats:
+            return
+        record = {
+            "strategy": strategy,
+            "win": None if sol_node is None else sol_node.checkWin(),
+            "timeout": timeout,
+            "length": None if sol is None else len(sol),
+            "iterations": counters.get("iterations", 0),
+            "generated": counters.get("generated", 0),
+            "visited": counters.get("visited", 0),
+            "elapsed": (time.perf_counter() - start) * 1000.0
+        }
+        self._last_stats = record
+        self._stats_log.append(record)
+        total = self._total_stats
+        total["calls"] += 1
+        total["wins"] += int(bool(record["win"]))
+        total["timeouts"] += int(timeout)
+        for name in ["iterations", "generated", "visited", "elapsed"]:
+            total[name] += record[name]
+        total["strategies"][strategy] = total["strategies"].get(strategy, 0) + 1
+
+    """
+    Private function to check if the last solution can be replayed on the map, all the
+    changed tiles since the last solved map has to be one of the replay_edits
+    """
+    def _can_replay(self, map):
+        if not self._replay or self._last_map is None:
+            return False
+        if len(map) != len(self._last_map) or len(map[0]) != len(self._last_map[0]):
+            return False
+        for old_row, new_row in zip(self._last_map, map):
+            if old_row == new_row:
+                continue
+            for old, new in zip(old_row, new_row):
+                if old != new and (old, new) not in self._replay_edits:
+                    return False
+        return True
+
+    """
+    Private function that runs the strategy chain (or the portfolio) on the state, it also
+    returns the name of the winning strategy and the counters summed over all the strategies.
+    In the shared mode the best node of the whole chain is returned if no strategy wins
+    """
+    def _search(self, state, time_budget):
+        if time_budget is None:
+            time_budget = self._solver_time
+        if self._portfolio:
+            return self._solve_portfolio(state, time_budget)
+
+        stop = None
+        if time_budget is not None:
+            deadline = time.perf_counter() + time_budget / 1000.0
+            stop = lambda: time.perf_counter() >= deadline
+
+        best_sol, best_node = None, None
+        counters = {}
+        table, remaining = None, self._solver_power
+        if self._shared:
+            table = SearchTable()
+        for i, strategy in enumerate(self._strategies):
+            power = self._solver_power
+            if table is not None and self._solver_power > 0:
+                if remaining <= 0:
+                    break
+                power = max(1, remaining // (len(self._strategies) - i))
+            sol, sol_node, strategy_counters = _run_strategy(state, strategy, power, stop, table, self._agent_instances)
+            remaining -= strategy_counters["iterations"]
+            _add_counters(counters, strategy_counters)
+            if sol_node.checkWin():
+                return sol, sol_node, False, _strategy_name(strategy), counters
+            if _is_better(sol_node, best_node):
+                best_sol, best_node = sol, sol_node
+            if stop is not None and stop():
+                return best_sol, best_node, True, "none", counters
+        if table is not None:
+            return best_sol, best_node, False, "none", counters
+        return sol, sol_node, False, "none", counters
+
+    """
+    Private function that runs all the strategies at the same time in the process pool,
+    the first winning strategy cancels the rest. If no strategy wins the result is picked the
+    same way as the sequential chain
+    """
+    def _solve_portfolio(self, state, time_budget):
+        if self._pool is None:
+            context = multiprocessing.get_context()
+            self._cancel_event = context.Event()
+            self._pool = ProcessPoolExecutor(max_workers=len(self._strategies), mp_context=context,
+                initializer=_init_portfolio_worker, initargs=(self._cancel_event,))
+        self._cancel_event.clear()
+        start = time.perf_counter()
+
+        futures = [self._pool.submit(_run_portfolio_strategy, state, strategy, self._solver_power, time_budget,\
+            self._agents) for strategy in self._strategies]
+        results = [None] * len(futures)
+        winner = None
+        counters = {}
+        pending = set(futures)
+        while len(pending) > 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                sol, sol_state, depth, strategy_counters = f.result()
+                _add_counters(counters, strategy_counters)
+                node = Node(sol_state, None, None)
+                node.depth = depth
+                index = futures.index(f)
+                results[index] = (sol, node)
+                if winner is None and sol_state.checkWin():
+                    winner = (sol, node, _strategy_name(self._strategies[index]))
+                    self._cancel_event.set()
+        if winner is not None:
+            return winner[0], winner[1], False, winner[2], counters
+
+        timeout = time_budget is not None and time.perf_counter() - start >= time_budget / 1000.0
+        if timeout:
+            best_sol, best_node = None, None
+            for sol, node in results:
+                if _is_better(node, best_node):
+                    best_sol, best_node = sol, node
+            return best_sol, best_node, True, "none", counters
+        return results[-1][0], results[-1][1], False, "none", counters
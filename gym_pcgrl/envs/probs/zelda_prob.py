@@ -2,7 +2,7 @@ import os
 import numpy as np
 from PIL import Image
 from gym_pcgrl.envs.probs.problem import Problem
-from gym_pcgrl.envs.helper import get_range_reward, get_tile_locations, calc_num_regions, calc_certain_tile, run_dikjstra
+from gym_pcgrl.envs.helper import get_int_map, get_range_reward, calc_nearest_dist, SearchGrid
 
 """
 Generate a fully connected GVGAI zelda level where the player can reach key then the door.
@@ -22,6 +22,8 @@ class ZeldaProblem(Problem):
         self._border_tile = "solid"
 
         self._max_enemies = 5
+        # the search buffers are reused by every get_stats call
+        self._grid = SearchGrid()
 
         self._target_enemy_dist = 4
         self._target_path = 16
@@ -78,36 +80,42 @@ class ZeldaProblem(Problem):
         The used status are "reigons": number of connected empty tiles, "path-length": the longest path across the map
     """
     def get_stats(self, map):
-        map_locations = get_tile_locations(map, self.get_tile_types())
+        tiles = self.get_tile_types()
+        int_map = get_int_map(map, tiles)
+        counts = np.bincount(int_map.ravel(), minlength=len(tiles))
+        enemy_tiles = [tiles.index(t) for t in ["bat", "spider", "scorpion"]]
         map_stats = {
-            "player": calc_certain_tile(map_locations, ["player"]),
-            "key": calc_certain_tile(map_locations, ["key"]),
-            "door": calc_certain_tile(map_locations, ["door"]),
-            "enemies": calc_certain_tile(map_locations, ["bat", "spider", "scorpion"]),
-            "regions": calc_num_regions(map, map_locations, ["empty", "player", "key", "bat", "spider", "scorpion"]),
+            "player": int(counts[tiles.index("player")]),
+            "key": int(counts[tiles.index("key")]),
+            "door": int(counts[tiles.index("door")]),
+            "enemies": int(counts[enemy_tiles].sum()),
+            "regions": 0,
             "nearest-enemy": 0,
             "path-length": 0
         }
+        grid = self._grid
+        passable = grid.get_mask(int_map, [tiles.index(t) for t in ["empty", "player", "key"]] + enemy_tiles)
+        player = None
+        if map_stats["player"] == 1:
+            p_y,p_x = np.argwhere(int_map == tiles.index("player"))[0]
+            player = grid.get_cell(p_x, p_y)
+        # the region of the player is flooded first so it also has the distances from the player
+        map_stats["regions"] = grid.count_regions(passable, player)
         if map_stats["player"] == 1 and map_stats["regions"] == 1:
-            p_x,p_y = map_locations["player"][0]
-            enemies = []
-            enemies.extend(map_locations["spider"])
-            enemies.extend(map_locations["bat"])
-            enemies.extend(map_locations["scorpion"])
-            if len(enemies) > 0:
-                dikjstra,_ = run_dikjstra(p_x, p_y, map, ["empty", "player", "bat", "spider", "scorpion"])
-                min_dist = self._width * self._height
-                for e_x,e_y in enemies:
-                    if dikjstra[e_y][e_x] > 0 and dikjstra[e_y][e_x] < min_dist:
-                        min_dist = dikjstra[e_y][e_x]
-                map_stats["nearest-enemy"] = min_dist
+            key_dist = None
             if map_stats["key"] == 1 and map_stats["door"] == 1:
-                k_x,k_y = map_locations["key"][0]
-                d_x,d_y = map_locations["door"][0]
-                dikjstra,_ = run_dikjstra(p_x, p_y, map, ["empty", "key", "player", "bat", "spider", "scorpion"])
-                map_stats["path-length"] += dikjstra[k_y][k_x]
-                dikjstra,_ = run_dikjstra(k_x, k_y, map, ["empty", "player", "key", "door", "bat", "spider", "scorpion"])
-                map_stats["path-length"] += dikjstra[d_y][d_x]
+                k_y,k_x = np.argwhere(int_map == tiles.index("key"))[0]
+                key_dist = grid.get_dist(grid.get_cell(k_x, k_y))
+            if map_stats["enemies"] > 0:
+                # the key blocks the way to the enemies
+                min_dist = calc_nearest_dist(int_map, [(p_x, p_y)],\
+                    [tiles.index(t) for t in ["empty", "player"]] + enemy_tiles, enemy_tiles)
+                if min_dist < 0:
+                    min_dist = self._width * self._height
+                map_stats["nearest-enemy"] = min_dist
+            if key_dist is not None:
+                map_stats["path-length"] = key_dist + calc_nearest_dist(int_map, [(k_x, k_y)],\
+                    [tiles.index(t) for t in ["empty", "player", "key", "door"]] + enemy_tiles, [tiles.index("door")])
 
         return map_stats
 
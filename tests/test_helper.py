@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+from gym_pcgrl.envs.helper import calc_num_regions, calc_longest_path, gen_random_map, get_string_map,\
+    get_tile_locations, run_dikjstra, run_bfs, calc_nearest_dist
+
+TILES = ["empty", "solid"]
+
+"""
+Private function to get the number of regions and the longest path of a map from the bitboard
+search (one passable value) and from the generic search, the generic search is used by adding a
+passable value that is never on the map
+
+Parameters:
+    map (string[][]): the map being tested
+
+Returns:
+    (int, int): the bitboard number of regions and longest path
+    (int, int): the generic number of regions and longest path
+"""
+def _get_results(map):
+    map_locations = get_tile_locations(map, TILES + ["unused"])
+    bitboard = (calc_num_regions(map, map_locations, ["empty"]),\
+        calc_longest_path(map, map_locations, ["empty"]))
+    generic = (calc_num_regions(map, map_locations, ["empty", "unused"]),\
+        calc_longest_path(map, map_locations, ["empty", "unused"]))
+    return bitboard, generic
+
+"""
+Random maps of square and non square sizes (including single rows and columns) from all empty
+to all solid give the same results with both searches
+"""
+@pytest.mark.parametrize("width,height", [(1, 1), (1, 9), (9, 1), (3, 7), (7, 3), (11, 11), (14, 14), (20, 9)])
+@pytest.mark.parametrize("density", [0, 0.2, 0.5, 0.8, 1])
+def test_bitboard_matches_generic_on_random_maps(width, height, density):
+    random = np.random.RandomState(width * 1000 + height * 10 + int(density * 10))
+    for _ in range(20):
+        int_map = gen_random_map(random, width, height, {0: 1 - density, 1: density})
+        map = get_string_map(int_map, TILES)
+        bitboard, generic = _get_results(map)
+        assert bitboard == generic, int_map
+
+"""
+A full row or column of empty tiles on the border or in the middle of a solid map (the tiles
+touching the ends of the rows of the bitboard) and a full solid row or column splitting an
+empty map give the same results with both searches
+"""
+@pytest.mark.parametrize("width,height", [(5, 5), (8, 3), (3, 8)])
+@pytest.mark.parametrize("fill,line", [(1, 0), (0, 1)])
+def test_bitboard_matches_generic_with_full_lines(width, height, fill, line):
+    for vertical in [False, True]:
+        for index in range(width if vertical else height):
+            int_map = np.full((height, width), fill, dtype=np.uint8)
+            if vertical:
+                int_map[:, index] = line
+            else:
+                int_map[index, :] = line
+            map = get_string_map(int_map, TILES)
+            bitboard, generic = _get_results(map)
+            assert bitboard == generic, int_map
+            # an empty line is one region, a solid line splits the map in two unless it is on the border
+            expected_regions = 1 if fill == 1 else 2 - int(index in [0, (width if vertical else height) - 1])
+            assert bitboard[0] == expected_regions, int_map
+
+"""
+Private function with the queue based dijkstra of the first version of run_dikjstra, it is the
+reference of the distances of the grid searches
+"""
+def _run_reference(x, y, map, passable_values):
+    dikjstra_map = np.full((len(map), len(map[0])), -1)
+    queue = [(x, y, 0)]
+    while len(queue) > 0:
+        (cx, cy, cd) = queue.pop(0)
+        if map[cy][cx] not in passable_values or (dikjstra_map[cy][cx] >= 0 and dikjstra_map[cy][cx] <= cd):
+            continue
+        dikjstra_map[cy][cx] = cd
+        for (dx, dy) in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+            nx, ny = cx + dx, cy + dy
+            if nx < 0 or ny < 0 or nx >= len(map[0]) or ny >= len(map):
+                continue
+            queue.append((nx, ny, cd + 1))
+    return dikjstra_map
+
+"""
+Private function to get random maps of empty (0), solid (1) and enemy (2) tiles as string maps
+and as the integer maps the problems pass to the grid searches
+"""
+def _get_random_maps(seed, count):
+    random = np.random.RandomState(seed)
+    maps = []
+    for _ in range(count):
+        width, height = random.randint(1, 15), random.randint(1, 15)
+        density = random.choice([0, 0.2, 0.4, 0.6])
+        int_map = gen_random_map(random, width, height, {0: 0.8 * (1 - density), 1: density, 2: 0.2 * (1 - density)})
+        maps.append((int_map, get_string_map(int_map, ["empty", "solid", "enemy"])))
+    return maps
+
+"""
+The single source distances of run_dikjstra are the same as the queue based dijkstra
+"""
+def test_run_dikjstra_matches_reference():
+    random = np.random.RandomState(1)
+    for _, map in _get_random_maps(1, 200):
+        x, y = random.randint(len(map[0])), random.randint(len(map))
+        dikjstra_map, visited_map = run_dikjstra(x, y, map, ["empty", "enemy"])
+        reference = _run_reference(x, y, map, ["empty", "enemy"])
+        assert (dikjstra_map == reference).all(), map
+        assert (visited_map == (reference >= 0)).all(), map
+
+"""
+Every cell of the multi source search of run_bfs has the distance to its nearest source from
+run_dikjstra, on string and integer maps
+"""
+def test_run_bfs_matches_nearest_run_dikjstra():
+    random = np.random.RandomState(2)
+    for int_map, map in _get_random_maps(2, 200):
+        sources = [(random.randint(len(map[0])), random.randint(len(map))) for _ in range(random.randint(1, 4))]
+        expected = np.full((len(map), len(map[0])), -1)
+        for (x, y) in sources:
+            dikjstra_map, _ = run_dikjstra(x, y, map, ["empty", "enemy"])
+            closer = (dikjstra_map >= 0) & ((expected < 0) | (dikjstra_map < expected))
+            expected[closer] = dikjstra_map[closer]
+        assert (run_bfs(map, sources, ["empty", "enemy"]) == expected).all(), map
+        assert (run_bfs(int_map, sources, [0, 2]) == expected).all(), map
+
+"""
+The early stopping search of calc_nearest_dist finds the same distance to the nearest enemy
+as the lowest run_dikjstra distance of all the enemy tiles, on string and integer maps
+"""
+def test_calc_nearest_dist_matches_run_dikjstra():
+    random = np.random.RandomState(3)
+    for int_map, map in _get_random_maps(3, 200):
+        sources = [(random.randint(len(map[0])), random.randint(len(map))) for _ in range(random.randint(1, 3))]
+        expected = -1
+        for (x, y) in sources:
+            dikjstra_map, _ = run_dikjstra(x, y, map, ["empty", "enemy"])
+            dists = dikjstra_map[(int_map == 2) & (dikjstra_map >= 0)]
+            if len(dists) > 0 and (expected < 0 or dists.min() < expected):
+                expected = dists.min()
+        assert calc_nearest_dist(map, sources, ["empty", "enemy"], ["enemy"]) == expected, map
+        assert calc_nearest_dist(int_map, sources, [0, 2], [2]) == expected, map
@@ -0,0 +1,104 @@
+import numpy as np
+from gym_pcgrl.envs.probs import PROBLEMS
+from gym_pcgrl.envs.helper import get_string_map
+from gym_pcgrl.envs.probs.benchmark import load_corpus
+
+"""
+Private function to get a MiniDungeon problem that keeps the solver stats for a map size
+"""
+def _get_mdungeon(map, **kwargs):
+    prob = PROBLEMS["mdungeon"]()
+    prob.adjust_param(width=len(map[0]), height=len(map), solver_stats=True, **kwargs)
+    return prob
+
+"""
+A wall on the cell (5,0) turns a step of the old solution into a move that does nothing, the
+rest of the old actions still reach the exit by a longer route than the new best solution
+"""
+def test_replay_bumping_into_new_wall_searches_again():
+    int_map = np.array([
+        [0, 6, 0, 7, 2, 0],
+        [0, 0, 6, 1, 6, 0],
+        [0, 0, 0, 0, 0, 0],
+        [5, 0, 3, 5, 0, 6],
+        [1, 6, 1, 0, 7, 0],
+        [5, 0, 1, 0, 0, 7]], dtype=np.uint8)
+    edited_map = int_map.copy()
+    edited_map[0][5] = 1
+
+    prob = _get_mdungeon(int_map, solver_replay=True)
+    tiles = prob.get_tile_types()
+    prob.get_stats(get_string_map(int_map, tiles))
+    stats = prob.get_stats(get_string_map(edited_map, tiles))
+    assert prob.get_solver_stats()["last"]["strategy"] != "replay"
+
+    fresh = _get_mdungeon(edited_map, solver_cache=0, solver_replay=False)
+    assert stats == fresh.get_stats(get_string_map(edited_map, tiles))
+    assert stats["sol-length"] == 5
+
+"""
+A wall away from the old solution keeps the same states along the way so it is replayed
+"""
+def test_replay_after_edit_off_the_solution():
+    int_map = np.array([
+        [2, 0, 0, 3],
+        [0, 0, 0, 0],
+        [0, 0, 0, 0]], dtype=np.uint8)
+    edited_map = int_map.copy()
+    edited_map[2][0] = 1
+
+    prob = _get_mdungeon(int_map, solver_replay=True)
+    tiles = prob.get_tile_types()
+    prob.get_stats(get_string_map(int_map, tiles))
+    stats = prob.get_stats(get_string_map(edited_map, tiles))
+    assert prob.get_solver_stats()["last"]["strategy"] == "replay"
+    assert stats["sol-length"] == 3
+
+"""
+The replay is off by default so the edited level is searched again
+"""
+def test_no_replay_by_default():
+    int_map = np.array([
+        [2, 0, 0, 3],
+        [0, 0, 0, 0],
+        [0, 0, 0, 0]], dtype=np.uint8)
+    edited_map = int_map.copy()
+    edited_map[2][0] = 1
+
+    prob = _get_mdungeon(int_map)
+    tiles = prob.get_tile_types()
+    prob.get_stats(get_string_map(int_map, tiles))
+    prob.get_stats(get_string_map(edited_map, tiles))
+    assert prob.get_solver_stats()["last"]["strategy"] != "replay"
+
+"""
+Private function to get an SMB problem that uses the reachability solver without the cache, so
+every level is searched and the agent can reuse its last search
+"""
+def _get_smb_reach():
+    prob = PROBLEMS["smb"]()
+    prob.adjust_param(solver_strategies=[("reach",)], solver_cache=0, solver_stats=True)
+    return prob
+
+"""
+Two problems edit two different levels with the same size and start in turns, every one of
+them resumes its own last search and gets the same stats as a fresh search of the level
+"""
+def test_resumed_reach_equals_fresh():
+    random = np.random.RandomState(0)
+    levels = [np.array([[int(t) for t in row] for row in level["map"]], dtype=np.uint8)\
+        for level in load_corpus("smb") if level["difficulty"] != "unsolvable"][:2]
+    probs = [_get_smb_reach() for _ in levels]
+    tiles = probs[0].get_tile_types()
+    fresh_visited = 0
+    for step in range(20):
+        index = step % len(levels)
+        # the edits are far enough from the start to resume the search
+        y, x = random.randint(levels[index].shape[0]), random.randint(10, levels[index].shape[1])
+        levels[index][y][x] = tiles.index("solid") if levels[index][y][x] == tiles.index("empty") else tiles.index("empty")
+        map = get_string_map(levels[index], tiles)
+        fresh = _get_smb_reach()
+        assert probs[index].get_stats(map) == fresh.get_stats(map)
+        fresh_visited += fresh.get_solver_stats()["total"]["visited"]
+    # the first search of every problem is a full search
+    assert sum(p.get_solver_stats()["total"]["visited"] for p in probs) < fresh_visited